@@ -9,7 +9,7 @@ import matplotlib.pyplot as plt
 
 sys.path.insert(0, "..")
 from utils import RESULTSPATH, NUCLEOTIDES, DATASET_STRAIN_DICT, SEGMENTS, CMAP
-from utils import load_all, get_dataset_names, create_nucleotide_ratio_matrix, get_sequence
+from utils import load_all, get_dataset_names, create_nucleotide_ratio_matrix, get_sequence, get_sampling_window
 
 
 def nucleotide_enrichment_overview_expected(df, exp_df):
@@ -68,17 +68,10 @@ def analyze_adenin_distribution_datasets(dfs: list, dfnames: list):
             if len(df_s) == 0:
                 continue
             seq = get_sequence(st, seg)
-            start = int(df_s["Start"].mean())
-            end = int(df_s["End"].mean())
-            s = (max(start-200, 50), start+200)
-            e = (end-200, min(end+200, len(seq)-50))
-            
-            # skip if there is no range given this would lead to oversampling of a single position
-            if s[0] == s[1] or e[0] == e[1]:
-                continue
-            # positions are overlapping
-            if s[1] > e[0]:
+            window = get_sampling_window(df_s, len(seq))
+            if window is None:
                 continue
+            s, e = window
 
             seq = seq[s[0]:s[1]] + seq[e[0]:e[1]]
 
@@ -0,0 +1,15 @@
+'''
+    Packs the reference sequences of all strains into one binary archive,
+    that is memory mapped by get_sequence() and get_seq_len(). Needs to be
+    run again after adding new strains.
+'''
+import sys
+
+sys.path.insert(0, "..")
+from utils import build_genome_archive, open_genome_archive
+
+
+if __name__ == "__main__":
+    path = build_genome_archive()
+    archive = open_genome_archive()
+    print(f"Wrote {len(archive['index'])} sequences to {path}")
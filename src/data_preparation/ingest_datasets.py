@@ -0,0 +1,16 @@
+'''
+    Converts the csv files of each dataset into one columnar container, that
+    is read by load_single_dataset(), load_dataset() and load_mapped_reads().
+    Only SRA accession numbers whose files changed since the last run are read
+    again.
+'''
+import sys
+
+sys.path.insert(0, "..")
+from utils import build_dataset_container, get_dataset_names
+
+
+if __name__ == "__main__":
+    for dfname in get_dataset_names():
+        path, n_rebuilt = build_dataset_container(dfname)
+        print(f"{dfname}: {n_rebuilt} accession numbers updated in {path}")
@@ -8,30 +8,35 @@ import warnings
 import matplotlib
 
 import numpy as np
+import pandas as pd
 import matplotlib.pyplot as plt
 
 sys.path.insert(0, "..")
-from utils import load_all, get_dataset_names, calc_cliffs_d
-from utils import RESULTSPATH
+from utils import load_all, get_dataset_names, get_group_names, calc_cliffs_d, calc_cliffs_d_matrix
+from utils import RESULTSPATH, N_WORKERS
 from overall_comparision.general_analyses import calc_start_end_lengths
 
 
-def compare_iav_ibv(dfs1: list, dfnames1: list, dfs2: list, dfnames2: list, categories: list, analysis: str)-> None:
+def compare_iav_ibv(df: pd.DataFrame, by: str, groups: list, categories: list, analysis: str)-> None:
     '''
-        compare the given datasets in their difference of start and end
+        compare two classes of datasets in their difference of start and end
         sequence length.
-        :param dfs: The list of DataFrames containing the data, preprocessed
-            with sequence_df(df)
-        :param dfnames: The names associated with each DataFrame in `dfs`
+        :param df: Pandas DataFrame with the DelVGs of all datasets, created
+            by to_long_format()
+        :param by: column that defines the classes, e.g. "cultivation" or
+            "virus"
+        :param groups: the two values of the column `by` to compare, in the
+            order of the categories
+        :param categories: labels of the two classes
+        :param analysis: name of the analysis, used for the result file
 
         :return: None
     '''
-    data1, _ = calc_start_end_lengths(dfs1, dfnames1)
-    data2, _ = calc_start_end_lengths(dfs2, dfnames2)
-    list1 = [item for sublist in data1 for item in sublist]
-    list2 = [item for sublist in data2 for item in sublist]
-    plot_list = [list1, list2]
-    
+    plot_list, _ = calc_start_end_lengths(df[df[by].isin(groups)], by=by)
+    if len(plot_list) < 2 or min(len(l) for l in plot_list) == 0:
+        warnings.warn(f"Skipping {analysis}: not all of {groups} have DelVGs in column '{by}'")
+        return
+
     fig, axs = plt.subplots(1, 1, figsize=(5, 1.5), tight_layout=True)
     position_list = np.arange(0, 2)
     violin_parts = axs.violinplot(plot_list, position_list, showextrema=False, points=1000, showmeans=True, vert=False)
@@ -73,33 +78,27 @@ def compare_iav_ibv(dfs1: list, dfnames1: list, dfs2: list, dfnames2: list, cate
     plt.close()
 
 
-def create_comparision_matrix(dfs: list, dfnames: list):
+def create_comparision_matrix(df: pd.DataFrame, workers: int=1):
     '''
         compare the given datasets pairwise in their difference of start and
         end sequence length by creating a matrix.
-        :param dfs: The list of DataFrames containing the data, preprocessed
-            with sequence_df(df)
-        :param dfnames: The names associated with each DataFrame in `dfs`
+        :param df: Pandas DataFrame with the DelVGs of all datasets, created
+            by to_long_format()
+        :param workers: number of processes used to calculate Cliff's d
 
         :return: None
     '''
-    plot_list, _ = calc_start_end_lengths(dfs, dfnames)
+    dfnames = get_group_names(df)
+    plot_list, _ = calc_start_end_lengths(df)
+    cliffs_d_df = calc_cliffs_d_matrix(plot_list, dfnames, workers=workers)
 
     plt.figure(figsize=(10, 9))
     plt.rc("font", size=20)
-    # initialize an empty matrix
-    matrix_size = len(plot_list)
-    matrix = [[0] * matrix_size for _ in range(matrix_size)]
-    # calculate the differences and populate the matrix
-    for i, d1 in enumerate(plot_list):
-        for j, d2 in enumerate(plot_list):
-            if i == j:
-                matrix[i][j] = np.nan
-            else:
-                cliffs_d = calc_cliffs_d(d1, d2)
-                matrix[i][j] = abs(cliffs_d)
-                color = "black" if abs(cliffs_d) > 0.4 else "white"
-                plt.annotate(f"{cliffs_d:.2f}", xy=(j, i), color=color, ha='center', va='center', fontsize=10, fontweight='bold')
+    matrix = cliffs_d_df.abs().to_numpy()
+    for i, j in zip(*np.where(~np.isnan(matrix))):
+        cliffs_d = cliffs_d_df.iat[i, j]
+        color = "black" if abs(cliffs_d) > 0.4 else "white"
+        plt.annotate(f"{cliffs_d:.2f}", xy=(j, i), color=color, ha='center', va='center', fontsize=10, fontweight='bold')
 
     warnings.filterwarnings("ignore",category=matplotlib.cbook.mplDeprecation)
     plt.imshow(matrix, cmap="viridis", interpolation="nearest")
@@ -114,70 +113,39 @@ def create_comparision_matrix(dfs: list, dfnames: list):
         os.makedirs(save_path)
     plt.savefig(os.path.join(save_path, "cliffs_d_comparision_matrix.png"))
     plt.close()
+    cliffs_d_df.to_csv(os.path.join(save_path, "cliffs_d_comparision_matrix.csv"))
 
 
 if __name__ == "__main__":
     plt.style.use("seaborn")
 
-    IAV_dfnames = get_dataset_names(cutoff=40, selection="IAV")
-    IAV_dfs, _ = load_all(IAV_dfnames)
-    IBV_dfnames = get_dataset_names(cutoff=40, selection="IBV")
-    IBV_dfs, _ = load_all(IBV_dfnames)
+    dfnames = get_dataset_names(cutoff=40)
+    df, _ = load_all(dfnames, long_format=True)
+
     categories = ["IAV", "IBV"]
-    compare_iav_ibv(IAV_dfs, IAV_dfnames, IBV_dfs, IBV_dfnames, categories, analysis="IAV_IBV")
+    compare_iav_ibv(df, "virus", ["IAV", "IBV"], categories, analysis="IAV_IBV")
 
 ####### further analysis
 # in vitro against in vivo datasets
-    vitro_dfnames = get_dataset_names(cutoff=40, selection="in vitro")
-    vitro_dfs, _ = load_all(vitro_dfnames)
-    human_dfnames = get_dataset_names(cutoff=40, selection="in vivo human")
-    human_dfs, _ = load_all(human_dfnames)
-
     categories = ["in vitro", "in vivo human"]
-    compare_iav_ibv(vitro_dfs, vitro_dfnames, human_dfs, human_dfnames, categories, analysis="vivo_vitro")
+    compare_iav_ibv(df, "cultivation", ["in vitro", "in vivo human"], categories, analysis="vivo_vitro")
 
 # in vitro all IAV against BLEE and Sheng
-    vitro_iav_dfs = list()
-    vitro_iav_dfnames = list()
-    vitro_ibv_dfs = list()
-    vitro_ibv_dfnames = list()
-    for df, dfname in zip(vitro_dfs, vitro_dfnames):
-        if dfname in ["Alnaji2019_BLEE", "Sheng2018"]:
-            vitro_ibv_dfs.append(df)
-            vitro_ibv_dfnames.append(dfname)
-        else:
-            vitro_iav_dfs.append(df)
-            vitro_iav_dfnames.append(dfname)
-
     categories = ["IAV in vitro", "IBV in vitro"]
-    compare_iav_ibv(vitro_iav_dfs, vitro_iav_dfnames, vitro_ibv_dfs, vitro_ibv_dfnames, categories, analysis="vitro_IAV")
+    compare_iav_ibv(df[df["cultivation"] == "in vitro"], "virus", ["IAV", "IBV"], categories, analysis="vitro_IAV")
 
 # in vivo human all IBV against Berry A
-    vivo_iav_dfs = list()
-    vivo_iav_dfnames = list()
-    vivo_ibv_dfs = list()
-    vivo_ibv_dfnames = list()
-    for df, dfname in zip(human_dfs, human_dfnames):
-        if dfname == "Berry2021_A":
-            vivo_iav_dfs.append(df)
-            vivo_iav_dfnames.append(dfname)
-        else:
-            vivo_ibv_dfs.append(df)
-            vivo_ibv_dfnames.append(dfname)
-
     categories = ["IAV in vivo human", "IBV in vivo human"]
-    compare_iav_ibv(vivo_iav_dfs, vivo_iav_dfnames, vivo_ibv_dfs, vivo_ibv_dfnames, categories, analysis="vivo_IBV")
+    compare_iav_ibv(df[df["cultivation"] == "in vivo human"], "virus", ["IAV", "IBV"], categories, analysis="vivo_IBV")
 
 # IAV vitro vs vivo human
     categories = ["IAV in vitro", "IAV in vivo human"]
-    compare_iav_ibv(vitro_iav_dfs, vitro_iav_dfnames, vivo_iav_dfs, vitro_ibv_dfnames, categories, analysis="IAV_vitro_vivo")
+    compare_iav_ibv(df[df["virus"] == "IAV"], "cultivation", ["in vitro", "in vivo human"], categories, analysis="IAV_vitro_vivo")
 
 # IBV vitro vs vivo human
     categories = ["IBV in vitro", "IBV in vivo human"]
-    compare_iav_ibv(vitro_ibv_dfs, vivo_iav_dfnames, vivo_ibv_dfs, vivo_ibv_dfnames, categories, analysis="IBV_vitro_vivo")
+    compare_iav_ibv(df[df["virus"] == "IBV"], "cultivation", ["in vitro", "in vivo human"], categories, analysis="IBV_vitro_vivo")
 
 
 ### comparision matrix for all datasets together
-    dfnames = get_dataset_names(cutoff=40)
-    dfs, _ = load_all(dfnames)
-    create_comparision_matrix(dfs, dfnames)
\ No newline at end of file
+    create_comparision_matrix(df, workers=N_WORKERS)
@@ -4,39 +4,29 @@
 import os
 import sys
 
+import numpy as np
+import pandas as pd
 import matplotlib.pyplot as plt
 
-from collections import Counter
-
 sys.path.insert(0, "..")
 from utils import load_all, get_dataset_names, calc_cliffs_d
 from utils import RESULTSPATH, CMAP
-from overall_comparision.general_analyses import calc_DI_lengths
+from overall_comparision.general_analyses import calc_DI_length_table, get_length_tables
 
 
-def compare_DI_lengths(dfs: list, dfnames: list, labels: str, analysis: str="")-> None:
+def compare_DI_lengths(df: pd.DataFrame, by: str, groups: list, labels: list, analysis: str="")-> None:
     '''
-        compares the lengths of the DelVGs between three classes.
-        :param a_dfs: list of datasets for class a
-        :param a_dfnames: list of dataset names for class a
-        :param a_label: label of class a
-        :param b_dfs: list of datasets for class b
-        :param b_dfnames: list of dataset names for class b
-        :param b_label: label of class b
-        :param c_dfs: list of datasets for class c
-        :param c_dfnames: list of dataset names for class c
-        :param c_label: label of class c
+        compares the lengths of the DelVGs between two or three classes.
+        :param df: Pandas DataFrame with the DelVGs of all datasets, created
+            by to_long_format()
+        :param by: column that defines the classes, e.g. "cultivation" or
+            "virus"
+        :param groups: values of the column `by` to compare
+        :param labels: labels of the classes in the same order as groups
+        :param analysis: name of the analysis, used for the result file
 
         :return: None
     '''
-    def process_data(dfs, dfnames):
-        lengths_dict = calc_DI_lengths(dfs, dfnames)
-        final_d = dict({"PB2": Counter(), "PB1": Counter(), "PA": Counter(), "HA": Counter(), "NP": Counter(), "NA": Counter(), "M": Counter(), "NS": Counter()})
-        for d in lengths_dict.values():
-            for s in d.keys():
-                final_d[s] += Counter(d[s])
-        return final_d
-
     def calc_stats(x_1, x_2, s, e, h):
         cliffs_d = calc_cliffs_d(x_1, x_2)
         plt.plot([s, e], [h, h], lw=1, color='black')
@@ -45,24 +35,24 @@ def compare_DI_lengths(dfs: list, dfnames: list, labels: str, analysis: str="")-
         plt.text((s + e) / 2, h-0.0007, f"{cliffs_d:.2f}", ha='center', va='bottom', color='black')
         return
     
-    dicts = [process_data(df, name) for df, name in zip(dfs, dfnames)]
+    length_tables = get_length_tables(calc_DI_length_table(df[df[by].isin(groups)], by=by), by=by)
     figsize = (6, 2) if analysis == "vivo_vitro" else (5, 2)
     cm = plt.get_cmap(CMAP)
     colors = [cm(0/8), cm(3/8), cm(1/8)]
     bins = 30
     for s in ["PB2", "PB1", "PA"]:
-        lists = [[k for k, v in d[s].items() for _ in range(v)] for d in dicts]
+        lists = [length_tables.get((g, s), (np.array([]), np.array([]))) for g in groups]
         
         skip = False
-        for l in lists:
-            if len(l) < 1:
+        for _, weights in lists:
+            if sum(weights) < 1:
                 skip = True
         if skip == True:
             continue
         
         plt.figure(figsize=figsize, tight_layout=True)
-        for i, l in enumerate(lists):
-            plt.hist(l, alpha=0.5, label=labels[i], bins=bins, density=True, color=colors[i])
+        for i, (values, weights) in enumerate(lists):
+            plt.hist(values, weights=weights, alpha=0.5, label=labels[i], bins=bins, density=True, color=colors[i])
 
         if len(lists) == 2:
             start = 1100 if analysis == "IAV_IBV" else 800
@@ -91,80 +81,33 @@ def compare_DI_lengths(dfs: list, dfnames: list, labels: str, analysis: str="")-
 if __name__ == "__main__":
     plt.style.use("seaborn")
 
+    dfnames = get_dataset_names(cutoff=40)
+    df, _ = load_all(dfnames, long_format=True)
+
 # in vitro against in vivo datasets
-    vitro_dfnames = get_dataset_names(cutoff=40, selection="in vitro")
-    vitro_dfs, _ = load_all(vitro_dfnames)
-    vivo_dfnames = get_dataset_names(cutoff=40, selection="in vivo mouse")
-    vivo_dfs, _ = load_all(vivo_dfnames)
-    human_dfnames = get_dataset_names(cutoff=40, selection="in vivo human")
-    human_dfs, _ = load_all(human_dfnames)
-
-    dfs = [vitro_dfs, vivo_dfs, human_dfs]
-    dfnames = [vitro_dfnames, vivo_dfnames, human_dfnames]
     labels = ["in vitro", "in vivo mouse", "in vivo human"]
-    compare_DI_lengths(dfs, dfnames, labels, analysis="vivo_vitro")
+    compare_DI_lengths(df, "cultivation", labels, labels, analysis="vivo_vitro")
 
 # in vitro against in vivo human
-    dfs = [vitro_dfs, human_dfs]
-    dfnames = [vitro_dfnames, human_dfnames]
     labels = ["in vitro", "in vivo human"]
-    compare_DI_lengths(dfs, dfnames, labels, analysis="vivo_vitrohuman")
+    compare_DI_lengths(df, "cultivation", labels, labels, analysis="vivo_vitrohuman")
 
 # all IAV against all IBV datasets
-    IAV_dfnames = get_dataset_names(cutoff=40, selection="IAV")
-    IAV_dfs, _ = load_all(IAV_dfnames)
-    IBV_dfnames = get_dataset_names(cutoff=40, selection="IBV")
-    IBV_dfs, _ = load_all(IBV_dfnames)
-
-    dfs = [IAV_dfs, IBV_dfs]
-    dfnames = [IAV_dfnames, IBV_dfnames]
     labels = ["IAV", "IBV"]
-    compare_DI_lengths(dfs, dfnames, labels, analysis="IAV_IBV")
+    compare_DI_lengths(df, "virus", labels, labels, analysis="IAV_IBV")
 
 # in vitro all IAV against BLEE and Sheng
-    vitro_iav_dfs = list()
-    vitro_iav_dfnames = list()
-    vitro_ibv_dfs = list()
-    vitro_ibv_dfnames = list()
-    for df, dfname in zip(vitro_dfs, vitro_dfnames):
-        if dfname in ["Alnaji2019_BLEE", "Sheng2018"]:
-            vitro_ibv_dfs.append(df)
-            vitro_ibv_dfnames.append(dfname)
-        else:
-            vitro_iav_dfs.append(df)
-            vitro_iav_dfnames.append(dfname)
-
-    dfs = [vitro_iav_dfs, vitro_ibv_dfs]
-    dfnames = [vitro_iav_dfnames, vitro_ibv_dfnames]
     labels = ["IAV in vitro", "IBV in vitro"]
-    compare_DI_lengths(dfs, dfnames, labels, analysis="vitro_IAV")
+    compare_DI_lengths(df[df["cultivation"] == "in vitro"], "virus", ["IAV", "IBV"], labels, analysis="vitro_IAV")
 
 # in vivo human all IBV against Berry A
-    vivo_iav_dfs = list()
-    vivo_iav_dfnames = list()
-    vivo_ibv_dfs = list()
-    vivo_ibv_dfnames = list()
-    for df, dfname in zip(human_dfs, human_dfnames):
-        if dfname == "Berry2021_A":
-            vivo_iav_dfs.append(df)
-            vivo_iav_dfnames.append(dfname)
-        else:
-            vivo_ibv_dfs.append(df)
-            vivo_ibv_dfnames.append(dfname)
-
-    dfs = [vivo_iav_dfs, vivo_ibv_dfs]
-    dfnames = [vivo_iav_dfnames, vivo_ibv_dfnames]
     labels = ["IAV in vivo human", "IBV in vivo human"]
-    compare_DI_lengths(dfs, dfnames, labels, analysis="vivo_IBV")
+    compare_DI_lengths(df[df["cultivation"] == "in vivo human"], "virus", ["IAV", "IBV"], labels, analysis="vivo_IBV")
 
 # IAV vitro vs vivo human
-    dfs = [vitro_iav_dfs, vivo_iav_dfs]
-    dfnames = [vitro_iav_dfnames, vitro_ibv_dfnames]
     labels = ["IAV in vitro", "IAV in vivo human"]
-    compare_DI_lengths(dfs, dfnames, labels, analysis="IAV_vitro_vivo")
+    compare_DI_lengths(df[df["virus"] == "IAV"], "cultivation", ["in vitro", "in vivo human"], labels, analysis="IAV_vitro_vivo")
 
 # IBV vitro vs vivo human
-    dfs = [vitro_ibv_dfs, vivo_ibv_dfs]
-    dfnames = [vivo_iav_dfnames, vivo_ibv_dfnames]
     labels = ["IBV in vitro", "IBV in vivo human"]
-    compare_DI_lengths(dfs, dfnames ,labels, analysis="IBV_vitro_vivo")
+    compare_DI_lengths(df[df["virus"] == "IBV"], "cultivation", ["in vitro", "in vivo human"], labels, analysis="IBV_vitro_vivo")
@@ -9,7 +9,7 @@ import pandas as pd
 import matplotlib.pyplot as plt
 
 sys.path.insert(0, "..")
-from utils import load_all, get_dataset_names
+from utils import load_all, get_dataset_names, compact_delvg_df
 from utils import DATAPATH, RESULTSPATH, ACCNUMDICT, CUTOFF
 
 
@@ -107,6 +107,59 @@ def dataset_distributions(dfs: list, dfnames: list)-> None:
     stats_df.to_csv(os.path.join(save_path, f"dataset_stats_{CUTOFF}.csv"), float_format="%.2f", index=False)
 
 
+def calc_memory_usage(df: pd.DataFrame)-> int:
+    '''
+        calculates the memory usage of a DataFrame. Unlike
+        memory_usage(deep=True) python objects that are shared between rows,
+        like the reference sequence in "full_seq", are only counted once.
+        :param df: Pandas DataFrame
+
+        :return: memory usage in bytes
+    '''
+    total = df.memory_usage(deep=False).sum()
+    seen = set()
+    for col in df.columns:
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.cat.categories
+        if values.dtype != object:
+            continue
+        for obj in values:
+            if id(obj) not in seen:
+                seen.add(id(obj))
+                total += sys.getsizeof(obj)
+    return total
+
+
+def memory_report(dfs: list, dfnames: list)-> None:
+    '''
+        compares the memory usage of the preprocessed datasets to the compact
+        representation without sequence columns and writes it into a csv.
+        Shared objects are counted once, see calc_memory_usage().
+        :param dfs: The list of DataFrames containing the data, preprocessed
+            with sequence_df(df)
+        :param dfnames: The names of the datasets
+
+        :return: None
+    '''
+    results = dict({"Dataset": dfnames, "Size": list(), "Full [MB]": list(), "Compact [MB]": list()})
+    for df in dfs:
+        results["Size"].append(df.shape[0])
+        results["Full [MB]"].append(calc_memory_usage(df) / 1e6)
+        results["Compact [MB]"].append(calc_memory_usage(compact_delvg_df(df)) / 1e6)
+
+    results_df = pd.DataFrame(results)
+    results_df.loc[len(results_df)] = ["total", results_df["Size"].sum(), results_df["Full [MB]"].sum(), results_df["Compact [MB]"].sum()]
+    results_df["Saving [%]"] = (1 - results_df["Compact [MB]"] / results_df["Full [MB]"]) * 100
+    save_path = os.path.join(RESULTSPATH, "metadata")
+    if not os.path.exists(save_path):
+        os.makedirs(save_path)
+    results_df.to_csv(os.path.join(save_path, f"memory_usage_{CUTOFF}.csv"), float_format="%.2f", index=False)
+    with open(os.path.join(save_path, f"memory_usage_{CUTOFF}.txt"), "w") as f:
+        print(results_df.round(2), file=f)
+        print("Objects shared between rows (e.g. the reference sequence in full_seq) are counted once.", file=f)
+
+
 if __name__ == "__main__":
     plt.style.use("seaborn")
 
@@ -117,3 +170,4 @@ if __name__ == "__main__":
 
     dfs, _ = load_all(dfnames)
     dataset_distributions(dfs, dfnames)
+    memory_report(dfs, dfnames)
@@ -5,65 +5,122 @@
 '''
 import os
 import sys
+import argparse
 
 import numpy as np
+import pandas as pd
 import scipy.stats as stats
 import matplotlib.pyplot as plt
 
+from typing import Tuple
 from collections import Counter
 
 sys.path.insert(0, "..")
-from utils import load_all
-from utils import get_sequence, count_direct_repeats_overall, get_p_value_symbol, create_nucleotide_ratio_matrix, plot_heatmap, get_dataset_names
-from utils import SEGMENTS, RESULTSPATH, NUCLEOTIDES
+from utils import load_all, get_group_names
+from utils import get_sequence, count_direct_repeats_overall, get_p_value_symbol, create_nucleotide_ratio_matrix, plot_heatmap, get_dataset_names, monte_carlo_expected_test
+from utils import two_proportion_test, one_proportion_test, correct_p_values
+from utils import SEGMENTS, RESULTSPATH, NUCLEOTIDES, DATASET_STRAIN_DICT
 from overall_comparision.general_analyses import nucleotide_pair_table
 
 
-def plot_expected_vs_observed_nucleotide_enrichment_heatmaps(dfs: list, dfnames: list, expected_dfs: list, compared: str, folder: str="compare_expected")-> None:
+def split_datasets(df: pd.DataFrame, expected: object)-> Tuple[list, list, list]:
+    '''
+        splits the observed and the expected data into one entry per dataset.
+        :param df: Pandas DataFrame with the DelVGs of all datasets, created
+            by to_long_format()
+        :param expected: Pandas DataFrame with the expected data of all
+            datasets, created by to_long_format(), or a dictionary with the
+            exact expected distributions (see
+            generate_expected_distributions()) for each dataset name
+
+        :return: Tuple
+            list of the dataset names
+            list of DataFrames with the observed data of each dataset
+            list with the expected data of each dataset
+    '''
+    dfnames = get_group_names(df)
+    groups = df.groupby("dataset", observed=True).indices
+    dfs = [df.iloc[groups[dfname]] for dfname in dfnames]
+    if isinstance(expected, dict):
+        expected_dfs = [expected[dfname] for dfname in dfnames]
+    else:
+        exp_groups = expected.groupby("dataset", observed=True).indices
+        expected_dfs = [expected.iloc[exp_groups[dfname]] for dfname in dfnames]
+    return dfnames, dfs, expected_dfs
+
+
+def plot_expected_vs_observed_nucleotide_enrichment_heatmaps(df: pd.DataFrame, expected: object, compared: str, folder: str="compare_expected", correction: str=None)-> None:
     '''
         plot difference of expected vs observed nucleotide enrichment around
         deletion junctions as heatmap.
-        :param dfs: The list of DataFrames containing the data, preprocessed
-            with sequence_df(df)
-        :param dfnames: The names associated with each DataFrame in `dfs`
-        :param expected_dfs: The list of DataFrames containing the expected
-            data, preprocessed with sequence_df(df)
+        :param df: Pandas DataFrame with the DelVGs of all datasets, created
+            by to_long_format()
+        :param expected: Pandas DataFrame with the expected data of all
+            datasets, created by to_long_format(), or a dictionary with the
+            exact expected distributions (see
+            generate_expected_distributions()) for each dataset name
         :param compared: defines in title what data is compared
         :param folder: defines where to save the results
+        :param correction: None, "bonferroni" or "fdr_bh" to correct the
+            p-values of all tests in the figure for multiple testing
     
         :return: None
 
     '''
+    dfnames, dfs, expected_dfs = split_datasets(df, expected)
     fig, axs = plt.subplots(figsize=(10, 8), nrows=2, ncols=2)
     axs = axs.flatten()
+    probability_matrices = [create_nucleotide_ratio_matrix(df, "seq_around_deletion_junction") for df in dfs]
+    expected_probability_matrices = list()
+    for expected_df in expected_dfs:
+        if isinstance(expected_df, dict):
+            expected_probability_matrices.append(expected_df["nucleotides"])
+        else:
+            # adaptively sampled expected data weights the segments equally
+            weights = expected_df["weight"].to_numpy() if "weight" in expected_df.columns else None
+            expected_probability_matrices.append(create_nucleotide_ratio_matrix(expected_df, "seq_around_deletion_junction", weights))
+
+    # test all positions and nucleotides of a dataset at once
+    p_value_matrices = list()
+    for df, expected_df, probability_matrix, expected_probability_matrix in zip(dfs, expected_dfs, probability_matrices, expected_probability_matrices):
+        n_samples = len(df)
+        p1 = probability_matrix.to_numpy()
+        p2 = expected_probability_matrix.loc[probability_matrix.index, probability_matrix.columns].to_numpy()
+        if isinstance(expected_df, dict):
+            # the exact distributions are probabilities and no sample, test
+            # the observed ratios against them
+            n_s = min(n_samples, 1000)
+            k1 = np.trunc(n_s * p1)
+            n1 = k1 + np.trunc(n_s - n_s * p1)
+            p_value_matrices.append(one_proportion_test(k1, n1, p2))
+            continue
+        n_samples2 = len(expected_df)
+        n_s = min(n_samples, n_samples2, 1000)
+        n_samples2 = min(n_samples2, 1000)
+        # number of ones and zeros of a sample of size n_s with ratio p1
+        k1 = np.trunc(n_s * p1)
+        k2 = np.trunc(n_samples2 * p2)
+        n1 = k1 + np.trunc(n_s - n_s * p1)
+        n2 = k2 + np.trunc(n_samples2 - n_samples2 * p2)
+        # perform an ANOVA as done in Alaji2021
+        p_value_matrices.append(two_proportion_test(k1, n1, k2, n2, "anova"))
+    if correction is not None:
+        p_value_matrices = list(correct_p_values(np.array(p_value_matrices), correction))
+    p_value_matrices = [pd.DataFrame(p_values, index=m.index, columns=m.columns) for p_values, m in zip(p_value_matrices, probability_matrices)]
 
     for i, nuc in enumerate(NUCLEOTIDES.keys()):
         x = list()
         y = list()
         vals = list()
         val_labels = list()
-        for dfname, df, expected_df in zip(dfnames, dfs, expected_dfs):
-            df = df.reset_index()
-            probability_matrix = create_nucleotide_ratio_matrix(df, "seq_around_deletion_junction")
-            n_samples = len(df)
-            expected_probability_matrix = create_nucleotide_ratio_matrix(expected_df, "seq_around_deletion_junction")
-            n_samples2 = len(expected_df)
+        for dfname, probability_matrix, expected_probability_matrix, p_value_matrix in zip(dfnames, probability_matrices, expected_probability_matrices, p_value_matrices):
             for j in probability_matrix.index:
                 x.append(j)
                 y.append(dfname)
 
                 p1 = probability_matrix.loc[j,nuc]
                 p2 = expected_probability_matrix.loc[j,nuc]
-                if n_samples < n_samples2:
-                    n_s = n_samples
-                else:
-                    n_s = n_samples2
-                n_s = min(n_s, 1000)
-                n_samples2 = min(n_samples2, 1000)
-                test_array = np.concatenate((np.ones(int(n_s * p1)), np.zeros(int(n_s - n_s * p1))))
-                test_array2 = np.concatenate((np.ones(int(n_samples2 * p2)), np.zeros(int(n_samples2 - n_samples2 * p2))))
-                # perform an ANOVA as done in Alaji2021
-                pval = stats.f_oneway(test_array, test_array2).pvalue
+                pval = p_value_matrix.loc[j,nuc]
 
                 diff = p1 - p2
                 vals.append(diff)
@@ -117,20 +174,22 @@ def plot_expected_vs_observed_nucleotide_enrichment_heatmaps(dfs: list, dfnames:
     plt.close()
 
 
-def plot_expected_vs_observed_direct_repeat_heatmaps(dfs: list, dfnames: list, expected_dfs: list, compared: str, folder: str="compare_expected")-> None:
+def plot_expected_vs_observed_direct_repeat_heatmaps(df: pd.DataFrame, expected: object, compared: str, folder: str="compare_expected")-> None:
     '''
         plot difference of expected vs observed direct repeat ratios around
         deletion junctions as heatmap.
-        :param dfs: The list of DataFrames containing the data, preprocessed
-            with sequence_df(df)
-        :param dfnames: The names associated with each DataFrame in `dfs`
-        :param expected_dfs: The list of DataFrames containing the expected
-            data, preprocessed with sequence_df(df)
+        :param df: Pandas DataFrame with the DelVGs of all datasets, created
+            by to_long_format()
+        :param expected: Pandas DataFrame with the expected data of all
+            datasets, created by to_long_format(), or a dictionary with the
+            exact expected distributions (see
+            generate_expected_distributions()) for each dataset name
         :param compared: defines in title what data is compared
         :param folder: defines where to save the results
     
         :return: None
     '''
+    dfnames, dfs, expected_dfs = split_datasets(df, expected)
     fig, axs = plt.subplots(figsize=(10, 7))
     x = list()
     y = list()
@@ -141,7 +200,6 @@ def plot_expected_vs_observed_direct_repeat_heatmaps(dfs: list, dfnames: list, e
         expected_final_d = dict()
         for s in SEGMENTS:
             df_s = df[df["Segment"] == s]
-            expected_df_s = expected_df[expected_df["Segment"] == s]
             n_samples = len(df_s)
             if n_samples == 0:
                 continue
@@ -153,7 +211,15 @@ def plot_expected_vs_observed_direct_repeat_heatmaps(dfs: list, dfnames: list, e
                 else:
                     final_d[k] = v
 
-            expected_counts, _ = count_direct_repeats_overall(expected_df_s, seq)
+            if isinstance(expected_df, dict):
+                expected_counts = dict(enumerate(expected_df["direct_repeats"].get(s, np.zeros(len(counts)))))
+            else:
+                expected_df_s = expected_df[expected_df["Segment"] == s]
+                expected_counts, _ = count_direct_repeats_overall(expected_df_s, seq)
+                # adaptively sampled expected data weights the segments equally
+                if "weight" in expected_df_s.columns and len(expected_df_s) > 0:
+                    weight = expected_df_s["weight"].iloc[0]
+                    expected_counts = dict({k: v * weight for k, v in expected_counts.items()})
             for k, v in expected_counts.items():
                 if k in expected_final_d:
                     expected_final_d[k] += v
@@ -189,13 +255,17 @@ def plot_expected_vs_observed_direct_repeat_heatmaps(dfs: list, dfnames: list, e
     plt.close()
 
 
-def nucleotide_pair_plot(dfs: list, expected_dfs: list, pos: str, labels: list, folder: str="general_analysis")-> None:
+def nucleotide_pair_plot(df: pd.DataFrame, df2: pd.DataFrame, pos: str, labels: list, folder: str="general_analysis")-> None:
     '''
         calcualte the motifs of specified length before start and end of
-        deletion site.
-        :param dfs: The list of DataFrames containing the data, preprocessed
-            with sequence_df(df)
-        :param dfnames: The names associated with each DataFrame in `dfs`
+        deletion site. The relative occurrences are averaged over the datasets
+        of each of the two groups.
+        :param df: Pandas DataFrame with the DelVGs of the datasets of the
+            first group, created by to_long_format()
+        :param df2: Pandas DataFrame with the DelVGs of the datasets of the
+            second group, e.g. the expected data, created by to_long_format()
+        :param pos: "Start" or "End" of the deletion site
+        :param labels: labels of the two groups
         :param folder: defines where to save the results
     
         :return: None
@@ -229,14 +299,16 @@ def nucleotide_pair_plot(dfs: list, expected_dfs: list, pos: str, labels: list,
     x = np.arange(0, 16)
     y = np.zeros(16)
     y_exp = np.zeros(16)
-    for df in dfs:
-        y += get_counts(df)
+    groups = df.groupby("dataset", observed=True).indices
+    for idx in groups.values():
+        y += get_counts(df.iloc[idx])
 
-    for exp_df in expected_dfs:
-        y_exp += get_counts(exp_df)
+    groups2 = df2.groupby("dataset", observed=True).indices
+    for idx in groups2.values():
+        y_exp += get_counts(df2.iloc[idx])
 
-    y = y / len(dfs)
-    y_exp = y_exp / len(expected_dfs)
+    y = y / len(groups)
+    y_exp = y_exp / len(groups2)
     axs.bar(x-0.15, y, width=0.3, label=labels[0], edgecolor="black", color="firebrick")
     axs.bar(x+0.15, y_exp, width=0.3, label=labels[1], edgecolor="black", color="royalblue")
 
@@ -253,27 +325,62 @@ def nucleotide_pair_plot(dfs: list, expected_dfs: list, pos: str, labels: list,
     plt.close()
 
 
+def monte_carlo_expected_tables(df: pd.DataFrame, n_replicates: int=1000, folder: str="compare_expected")-> None:
+    '''
+        Compares the nucleotide enrichment and the direct repeats of each
+        dataset to many replicates of the expected data and saves z-scores and
+        empirical p-values as tables.
+        :param df: Pandas DataFrame with the DelVGs of all datasets, created
+            by to_long_format()
+        :param n_replicates: number of expected datasets per dataset
+        :param folder: defines where to save the results
+
+        :return: None
+    '''
+    nuc_dfs = list()
+    dr_dfs = list()
+    groups = df.groupby("dataset", observed=True).indices
+    for dfname in get_group_names(df):
+        nuc_df, dr_df = monte_carlo_expected_test(DATASET_STRAIN_DICT[dfname], df.iloc[groups[dfname]], n_replicates)
+        nuc_df.insert(0, "dataset", dfname)
+        dr_df.insert(0, "dataset", dfname)
+        nuc_dfs.append(nuc_df)
+        dr_dfs.append(dr_df)
+
+    save_path = os.path.join(RESULTSPATH, folder)
+    if not os.path.exists(save_path):
+        os.makedirs(save_path)
+    pd.concat(nuc_dfs, ignore_index=True).to_csv(os.path.join(save_path, "monte_carlo_nuc_occ.csv"), index=False)
+    pd.concat(dr_dfs, ignore_index=True).to_csv(os.path.join(save_path, "monte_carlo_dir_rep.csv"), index=False)
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--monte_carlo", type=int, default=0, metavar="N_REPLICATES",
+                        help="also save the Monte-Carlo tables with this many replicates per dataset (slow, off by default)")
+    args = parser.parse_args()
+
     plt.style.use("seaborn")
 
     '''
     dfnames = get_dataset_names(cutoff=40)
-    dfs, expected_dfs = load_all(dfnames, expected=True)
+    df, expected_df = load_all(dfnames, expected=True, long_format=True)
 
-#    plot_expected_vs_observed_nucleotide_enrichment_heatmaps(dfs, dfnames, expected_dfs, "observed-expected")
- #   plot_expected_vs_observed_direct_repeat_heatmaps(dfs, dfnames, expected_dfs, "observed-expected")
-  #  nucleotide_pair_table(expected_dfs, dfnames, m_len=2, folder="compare_expected")
+#    plot_expected_vs_observed_nucleotide_enrichment_heatmaps(df, expected_df, "observed-expected")
+ #   plot_expected_vs_observed_direct_repeat_heatmaps(df, expected_df, "observed-expected")
+  #  nucleotide_pair_table(expected_df, folder="compare_expected")
 
     labels = ["observed", "expected"]
-    nucleotide_pair_plot(dfs, expected_dfs, "Start", labels, folder="compare_expected")
-    nucleotide_pair_plot(dfs, expected_dfs, "End", labels, folder="compare_expected")
+    nucleotide_pair_plot(df, expected_df, "Start", labels, folder="compare_expected")
+    nucleotide_pair_plot(df, expected_df, "End", labels, folder="compare_expected")
     '''
 
-    IAV_dfnames = get_dataset_names(cutoff=40, selection="IAV")
-    IAV_dfs, _ = load_all(IAV_dfnames)
-    IBV_dfnames = get_dataset_names(cutoff=40, selection="IBV")
-    IBV_dfs, _ = load_all(IBV_dfnames)
+    dfnames = get_dataset_names(cutoff=40)
+    df, _ = load_all(dfnames, long_format=True)
     labels = ["IAV", "IBV"]
 
-    nucleotide_pair_plot(IAV_dfs, IBV_dfs, "Start", labels, folder="compare_expected/IAV_IBV")
-    nucleotide_pair_plot(IAV_dfs, IBV_dfs, "End", labels, folder="compare_expected/IAV_IBV")
\ No newline at end of file
+    nucleotide_pair_plot(df[df["virus"] == "IAV"], df[df["virus"] == "IBV"], "Start", labels, folder="compare_expected/IAV_IBV")
+    nucleotide_pair_plot(df[df["virus"] == "IAV"], df[df["virus"] == "IBV"], "End", labels, folder="compare_expected/IAV_IBV")
+
+    if args.monte_carlo > 0:
+        monte_carlo_expected_tables(df, n_replicates=args.monte_carlo)
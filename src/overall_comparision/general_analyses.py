@@ -13,17 +13,17 @@ from typing import Tuple
 from collections import Counter
 
 sys.path.insert(0, "..")
-from utils import load_all, get_sequence, get_seq_len, get_p_value_symbol, plot_heatmap, create_nucleotide_ratio_matrix, count_direct_repeats_overall, get_dataset_names, sort_datasets_by_type
+from utils import load_all, get_sequence, get_seq_len, get_p_value_symbol, plot_heatmap, create_nucleotide_ratio_matrix, count_direct_repeats_overall, get_dataset_names
+from utils import bootstrap_profiles, calc_weighted_median, get_group_names, sort_long_format_by_type
 from utils import SEGMENTS, RESULTSPATH, DATASET_STRAIN_DICT, CMAP, NUCLEOTIDES, CUTOFF
 
 
-def plot_distribution_over_segments(dfs: list, dfnames: list, folder: str="general_analysis")-> None:
+def plot_distribution_over_segments(df: pd.DataFrame, folder: str="general_analysis")-> None:
     '''
         creates a plot that shows how the DelVGs are distributed over the
         segments for a given list of datasets.
-        :param dfs: The list of DataFrames containing the data, preprocessed
-            with sequence_df(df)
-        :param dfnames: The names associated with each DataFrame in `dfs`
+        :param df: Pandas DataFrame with the DelVGs of all datasets, created
+            by to_long_format()
         :param folder: defines where to save the results
     
         :return: None
@@ -32,24 +32,20 @@ def plot_distribution_over_segments(dfs: list, dfnames: list, folder: str="gener
     cm = plt.get_cmap(CMAP)
     colors = [cm(1.*i/len(SEGMENTS)) for i in range(len(SEGMENTS))]
 
-    pvalues = list()
-    x = np.arange(0, len(dfs))
-    y = dict({s: list() for s in SEGMENTS})
-    for df, dfname in zip(dfs, dfnames):
-        fractions = df["Segment"].value_counts() / len(df) * 100
-        for s in SEGMENTS:
-            if s not in fractions:
-                fractions[s] = 0.0
-            y[s].append(fractions[s])
-        
-        f_obs = fractions
-        full_seqs = np.array([get_seq_len(DATASET_STRAIN_DICT[dfname], seg) for seg in SEGMENTS])
-        f_exp = full_seqs / sum(full_seqs) * 100
-        _, pvalue = stats.chisquare(f_obs, f_exp)
-        pvalues.append(pvalue)
+    counts = df.groupby(["dataset", "Segment"], observed=True).size().unstack(fill_value=0).reindex(index=get_group_names(df), columns=SEGMENTS, fill_value=0)
+    dfnames = counts.index.to_list()
+    n = counts.sum(axis=1).to_numpy()
+    fractions = counts.to_numpy() / n[:, np.newaxis] * 100
+    y = dict({s: fractions[:, i] for i, s in enumerate(SEGMENTS)})
+
+    strains = df.groupby("dataset", observed=True)["Strain"].first()
+    full_seqs = np.array([[get_seq_len(strains[dfname], seg) for seg in SEGMENTS] for dfname in dfnames])
+    f_exp = full_seqs / full_seqs.sum(axis=1, keepdims=True) * 100
+    _, pvalues = stats.chisquare(fractions, f_exp, axis=1)
 
+    x = np.arange(0, len(dfnames))
     bar_width = 0.7
-    bottom = np.zeros(len(dfs))
+    bottom = np.zeros(len(dfnames))
 
     for i, s in enumerate(SEGMENTS):
         axs.barh(x, y[s], bar_width, color=colors[i], label=s, left=bottom, edgecolor="black")
@@ -59,7 +55,7 @@ def plot_distribution_over_segments(dfs: list, dfnames: list, folder: str="gener
         bottom += y[s]
     
     axs.set_xlabel("Fraction of DelVGs per segment [%]")
-    plt.yticks(range(len(dfnames)), [f"{dfname} (n={len(df)}) {get_p_value_symbol(p)}  " for dfname, df, p in zip(dfnames, dfs, pvalues)])
+    plt.yticks(range(len(dfnames)), [f"{dfname} (n={n_d}) {get_p_value_symbol(p)}  " for dfname, n_d, p in zip(dfnames, n, pvalues)])
     axs.legend(loc="upper center", bbox_to_anchor=(0.3, 1.1), fancybox=True, shadow=True, ncol=4)
     
     plt.tight_layout()
@@ -74,12 +70,11 @@ def plot_distribution_over_segments(dfs: list, dfnames: list, folder: str="gener
     frac_df.to_csv(os.path.join(save_path, "fraction_segments.csv"), index=False)
 
 
-def calculate_deletion_shifts(dfs: list, dfnames: list, folder: str="general_analysis")-> None:
+def calculate_deletion_shifts(df: pd.DataFrame, folder: str="general_analysis")-> None:
     '''
         creates a plot that shows the deletion shifts of the DelVGs.
-        :param dfs: The list of DataFrames containing the data, preprocessed
-            with sequence_df(df)
-        :param dfnames: The names associated with each DataFrame in `dfs`
+        :param df: Pandas DataFrame with the DelVGs of all datasets, created
+            by to_long_format()
         :param folder: defines where to save the results
     
         :return: None
@@ -88,25 +83,20 @@ def calculate_deletion_shifts(dfs: list, dfnames: list, folder: str="general_ana
     cm = plt.get_cmap(CMAP)
     colors = [cm(0/8), cm(3/8), cm(1/8)]
 
-    symbols = list()
-    x = np.arange(0, len(dfs))
-    y = dict({n: list() for n in [2, 0, 1]})
-    for df in dfs:
-        df["length"] = df["deleted_sequence"].apply(len)
-        df["shift"] = df["length"] % 3
-        shifts = df["shift"].value_counts()
-        n = df.shape[0]
-        for idx in [2, 0, 1]:
-            y[idx].append(shifts.loc[idx] / n * 100)
-
-        f_obs = shifts / sum(shifts) * 100
-        f_exp = [33.3333333, 33.3333333, 33.3333333]
-        _, pvalue = stats.chisquare(f_obs, f_exp)
-        symbol = get_p_value_symbol(pvalue)
-        symbols.append(symbol)
+    shifts = df["deleted_sequence"].str.len() % 3
+    counts = df.groupby(["dataset", shifts.rename("shift")], observed=True).size().unstack(fill_value=0).reindex(index=get_group_names(df), columns=[2, 0, 1], fill_value=0)
+    dfnames = counts.index.to_list()
+    n = counts.sum(axis=1).to_numpy()
+    fractions = counts.to_numpy() / n[:, np.newaxis] * 100
+    y = dict({idx: fractions[:, i] for i, idx in enumerate([2, 0, 1])})
+
+    f_exp = np.full(fractions.shape, 100 / 3)
+    _, pvalues = stats.chisquare(fractions, f_exp, axis=1)
+    symbols = [get_p_value_symbol(pvalue) for pvalue in pvalues]
 
+    x = np.arange(0, len(dfnames))
     bar_width = 0.7
-    bottom = np.zeros(len(dfs))
+    bottom = np.zeros(len(dfnames))
     labels = dict({"shift -1": 2, "in-frame": 0, "shift +1": 1})
     for i, (label, idx) in enumerate(labels.items()):
         axs.barh(x, y[idx], bar_width, color=colors[i], label=label, left=bottom, edgecolor="black")
@@ -116,7 +106,7 @@ def calculate_deletion_shifts(dfs: list, dfnames: list, folder: str="general_ana
     
     axs.set_xlim(right=100)
     axs.set_xlabel("Fraction of deletion shift [%]")
-    plt.yticks(range(len(dfnames)), [f"{dfname} (n={len(df)}) {s}  " for dfname, df, s in zip(dfnames, dfs, symbols)])
+    plt.yticks(range(len(dfnames)), [f"{dfname} (n={n_d}) {s}  " for dfname, n_d, s in zip(dfnames, n, symbols)])
     axs.legend(loc="upper center", bbox_to_anchor=(0.3, 1.1), fancybox=True, shadow=True, ncol=3)
 
     plt.tight_layout()
@@ -127,92 +117,102 @@ def calculate_deletion_shifts(dfs: list, dfnames: list, folder: str="general_ana
     plt.close()
  
 
-def calc_DI_lengths(dfs: list, dfnames: list)-> dict:
+def calc_DI_length_table(df: pd.DataFrame, by: str="dataset")-> pd.DataFrame:
     '''
         counts the length of the DelVGs for each segment independently.
-        :param dfs: The list of DataFrames containing the data, preprocessed
-            with sequence_df(df)
-        :param dfnames: The names associated with each DataFrame in `dfs`
+        :param df: Pandas DataFrame with the DelVGs of all datasets, created
+            by to_long_format()
+        :param by: column to group the DelVGs by, e.g. "dataset",
+            "cultivation" or "virus"
         
-        :return: dictionary with the DelVG lengths per segment for each dataset
+        :return: DataFrame with the number of DelVGs ("count") for each group,
+            segment and DelVG length ("length")
     '''
-    overall_count_dict = dict()
-    for df, dfname in zip(dfs, dfnames):
-        # create a dict for each segment including the NGS read count
-        count_dict = dict()
-        for s in SEGMENTS:
-            count_dict[s] = dict()
-
-        for _, r in df.iterrows():
-            DVG_Length = len(r["full_seq"])-len(r["deleted_sequence"])
-            if DVG_Length in count_dict[r["Segment"]]:
-                count_dict[r["Segment"]][DVG_Length] += 1
-            else:
-                count_dict[r["Segment"]][DVG_Length] = 1
-
-        overall_count_dict[dfname] = count_dict
+    lengths = (df["full_seq"].str.len() - df["deleted_sequence"].str.len()).rename("length")
+    count_df = df.groupby([by, "Segment", lengths], observed=True).size().rename("count").reset_index()
 
     calc_means = False
     if calc_means:
-        in_vivo = list()
-        in_vitro = list()
-        min_median = (2000, "dataset name")
-        max_median = (0, "dataset name")
-        for k, v in overall_count_dict.items():
-            print(k)
-            l = list()
-            for element in v.values():
-                for key, value in element.items():
-                    l.extend([key] * value)
-
-            median = np.median(l)
-            print(f"\t{median}")
-            if median < min_median[0]:
-                min_median = (median, k)
-            if median > max_median[0]:
-                max_median = (median, k)
-
-            if k in ["Wang2023", "Penn2022", "Lui2019", "Berry2021_A", "Berry2021_B", "Valesano2020_Vic", "826.9078947368421", "Berry2021_B_Yam", "Southgate2019", "Valesano2020_Yam"]:
-                in_vivo.extend(l)
-            else:
-                in_vitro.extend(l)
-        
+        medians = dict()
+        for dfname, idx in count_df.groupby(by, observed=True).indices.items():
+            l = count_df.iloc[idx].groupby("length")["count"].sum()
+            medians[dfname] = calc_weighted_median(l.index, l.values)
+            print(dfname)
+            print(f"\t{medians[dfname]}")
+
+        vivo_mean = lengths[df["cultivation"] != "in vitro"].mean()
+        vitro_mean = lengths[df["cultivation"] == "in vitro"].mean()
         print("")
-        print(f"in vivo:\t{np.mean(in_vivo)}")
-        print(f"in vitro:\t{np.mean(in_vitro)}")
-        print(np.mean(in_vivo) - np.mean(in_vitro))
+        print(f"in vivo:\t{vivo_mean}")
+        print(f"in vitro:\t{vitro_mean}")
+        print(vivo_mean - vitro_mean)
         print("")
 
-        print(f"Min median: {min_median[1]}\t{min_median[0]}")
-        print(f"Max median: {max_median[1]}\t{max_median[0]}")
+        min_median = min(medians.items(), key=lambda item: item[1])
+        max_median = max(medians.items(), key=lambda item: item[1])
+        print(f"Min median: {min_median[0]}\t{min_median[1]}")
+        print(f"Max median: {max_median[0]}\t{max_median[1]}")
+
+    return count_df
+
+
+def calc_DI_lengths(df: pd.DataFrame, by: str="dataset")-> dict:
+    '''
+        counts the length of the DelVGs for each segment independently.
+        :param df: Pandas DataFrame with the DelVGs of all datasets, created
+            by to_long_format()
+        :param by: column to group the DelVGs by, e.g. "dataset",
+            "cultivation" or "virus"
+        
+        :return: dictionary with the DelVG lengths per segment for each group
+    '''
+    count_df = calc_DI_length_table(df, by)
+    overall_count_dict = dict()
+    for group in get_group_names(df, by):
+        overall_count_dict[group] = dict({s: dict() for s in SEGMENTS})
+
+    for (group, s), idx in count_df.groupby([by, "Segment"], observed=True).indices.items():
+        rows = count_df.iloc[idx]
+        overall_count_dict[group][s] = dict(zip(rows["length"].tolist(), rows["count"].tolist()))
 
     return overall_count_dict
+
+
+def get_length_tables(count_df: pd.DataFrame, by: str="dataset")-> dict:
+    '''
+        splits the result of calc_DI_length_table() into frequency tables.
+        :param count_df: DataFrame created by calc_DI_length_table()
+        :param by: column the DelVGs were grouped by
+
+        :return: dictionary with (group, segment) as key and a Tuple of the
+            DelVG lengths and their counts as value
+    '''
+    lengths = count_df["length"].to_numpy()
+    counts = count_df["count"].to_numpy()
+    groups = count_df.groupby([by, "Segment"], observed=True).indices
+    return dict({key: (lengths[idx], counts[idx]) for key, idx in groups.items()})
     
 
-def length_distribution_histrogram(dfs: list, dfnames: list, folder: str="general_analysis")-> None:
+def length_distribution_histrogram(df: pd.DataFrame, folder: str="general_analysis")-> None:
     '''
         creates a histogram that shows the length distribution of the DelVGs.
-        :param dfs: The list of DataFrames containing the data, preprocessed
-            with sequence_df(df)
-        :param dfnames: The names associated with each DataFrame in `dfs`
+        :param df: Pandas DataFrame with the DelVGs of all datasets, created
+            by to_long_format()
         :param folder: defines where to save the results
     
         :return: None
     '''
     plt.rc("font", size=16)
-    overall_count_dict = calc_DI_lengths(dfs, dfnames)
+    length_tables = get_length_tables(calc_DI_length_table(df))
+    dfnames = get_group_names(df)
 
     for s in SEGMENTS:
         fig, axs = plt.subplots(len(dfnames), 1, figsize=(10, len(dfnames)*1.5), tight_layout=True)
         for i, dfname in enumerate(dfnames):
-            count_dict = overall_count_dict[dfname]
-            if len(count_dict[s].keys()) > 1:
-                counts_list = list()
-                for length, count in count_dict[s].items():
-                    counts_list.extend([length] * count)
-
-                m = round(np.mean(list(counts_list)), 2)                
-                axs[i].hist(count_dict[s].keys(), weights=count_dict[s].values(), bins=100, label=f"{dfname} (µ={m})", alpha=0.3)
+            lengths, counts = length_tables.get((dfname, s), (np.array([]), np.array([])))
+            if len(lengths) > 1:
+                m = round(np.average(lengths, weights=counts), 2)
+                axs[i].hist(lengths, weights=counts, bins=100, label=f"{dfname} (µ={m})", alpha=0.3)
                 axs[i].set_xlim(left=0)
                 axs[i].set_xlabel("sequence length (nts.)")
                 axs[i].set_ylabel("occurrences")
@@ -228,19 +228,19 @@ def length_distribution_histrogram(dfs: list, dfnames: list, folder: str="genera
         plt.close()
 
 
-def length_distribution_violinplot(dfs: list, dfnames: list, folder: str="general_analysis")-> None:
+def length_distribution_violinplot(df: pd.DataFrame, folder: str="general_analysis")-> None:
     '''
         creates a violinplot that shows the length distribution of the DelVGs.
-        :param dfs: The list of DataFrames containing the data, preprocessed
-            with sequence_df(df)
-        :param dfnames: The names associated with each DataFrame in `dfs`
+        :param df: Pandas DataFrame with the DelVGs of all datasets, created
+            by to_long_format()
         :param folder: defines where to save the results
     
         :return: None    
     '''
-    dfs, dfnames = sort_datasets_by_type(dfs, dfnames, cutoff=40)
+    df = sort_long_format_by_type(df, cutoff=40)
     plt.rc("font", size=16)
-    overall_count_dict = calc_DI_lengths(dfs, dfnames)
+    length_tables = get_length_tables(calc_DI_length_table(df))
+    dfnames = get_group_names(df)
 
     for s in SEGMENTS:
         fig, axs = plt.subplots(1, 1, figsize=(6, 4), tight_layout=True)
@@ -249,12 +249,11 @@ def length_distribution_violinplot(dfs: list, dfnames: list, folder: str="genera
         labels = list()
 
         for i, dfname in enumerate(dfnames):
-            n_counts = len(overall_count_dict[dfname][s].keys())
+            lengths, counts = length_tables.get((dfname, s), (np.array([]), np.array([])))
+            n_counts = len(lengths)
             if n_counts >= 1:
-                counts_list = list()
-                for length, count in overall_count_dict[dfname][s].items():
-                    counts_list.extend([length] * count)
-                plot_list.append(counts_list)
+                # the violins need the single observations
+                plot_list.append(np.repeat(lengths, counts))
                 position_list.append(i+1)            
             labels.append(f"{dfname} (n={n_counts})    ")
         
@@ -275,25 +274,26 @@ def length_distribution_violinplot(dfs: list, dfnames: list, folder: str="genera
         plt.close()
 
 
-def start_vs_end_lengths(dfs: list, dfnames: list, limit: int=0, folder: str="general_analysis")-> None:
+def start_vs_end_lengths(df: pd.DataFrame, limit: int=0, folder: str="general_analysis")-> None:
     '''
         plots the length of the start against the length of the end of the
         DelVG RNA sequences as a scatter plot (3' = start, 5' = end).
-        :param dfs: The list of DataFrames containing the data, preprocessed
-            with sequence_df(df)
-        :param dfnames: The names associated with each DataFrame in `dfs`
+        :param df: Pandas DataFrame with the DelVGs of all datasets, created
+            by to_long_format()
         :param limit: defines where to set the x- and y-axis limits
         :param folder: defines where to save the results
     
         :return: None  
     '''
-    for df, dfname in zip(dfs, dfnames):
+    df = df.assign(End_L=df["full_seq"].str.len() - df["End"])
+    groups = df.groupby(["dataset", "Segment"], observed=True).indices
+    for dfname in get_group_names(df):
         fig, axs = plt.subplots(2, 4, figsize=(12, 6), tight_layout=True)
         j = 0
         for i, s in enumerate(SEGMENTS):
-            df_s = df[df["Segment"] == s].copy()
+            idx = groups.get((dfname, s), np.array([], dtype=np.int64))
+            df_s = df.iloc[idx]
             if df_s.shape[0] > 1:
-                df_s["End_L"] = df_s["full_seq"].str.len() - df_s["End"]
                 axs[j,i%4].scatter(df_s["Start"], df_s["End_L"], s=1.0)
                 axs[j,i%4].plot([0, 1], [0, 1], transform=axs[j,i%4].transAxes, c="r", linewidth=0.5, linestyle="--")
                 if limit == 0:
@@ -333,50 +333,48 @@ def start_vs_end_lengths(dfs: list, dfnames: list, limit: int=0, folder: str="ge
         plt.close()
 
 
-def calc_start_end_lengths(dfs: list, dfnames: list, thresh: int=300)-> Tuple[list, list]:
+def calc_start_end_lengths(df: pd.DataFrame, thresh: int=300, by: str="dataset")-> Tuple[list, list]:
     '''
         calculates the difference of the start and end lengths of the DelVG RNA
         sequences (3' = start, 5' = end).
-        :param dfs: The list of DataFrames containing the data, preprocessed
-            with sequence_df(df)
-        :param dfnames: The names associated with each DataFrame in `dfs`
+        :param df: Pandas DataFrame with the DelVGs of all datasets, created
+            by to_long_format()
         :param thresh: defines to which difference DelVGs should be included,
             allows to exclude long DelVGs
+        :param by: column to group the DelVGs by, e.g. "dataset",
+            "cultivation" or "virus"
     
         :return: Tuple
-            List of difference between start and end lengths
+            List of difference between start and end lengths for each group
             List of labels for the plot
     '''
+    diffs = (df["Start"] - (df["full_seq"].str.len() - df["End"])).to_numpy()
+    groups = df.groupby(by, observed=True).indices
     plot_list = list()
     labels = list()
-    for df, dfname in zip(dfs, dfnames):
-        df["End_L"] = df["full_seq"].str.len() - df["End"]
-        l = (df["Start"] - df["End_L"]).to_list()
-        
-        l = [x for x in l if x <= thresh]
-        l = [x for x in l if x >= -thresh]
-        plot_list.append(l)
-        labels.append(f"{dfname} (n={df.shape[0]})")
+    for name in get_group_names(df, by):
+        l = diffs[groups[name]]
+        plot_list.append(l[(l <= thresh) & (l >= -thresh)].tolist())
+        labels.append(f"{name} (n={groups[name].size})")
 
     return plot_list, labels
 
 
-def diff_start_end_lengths(dfs: list, dfnames: list, folder: str="general_analysis")-> None:
+def diff_start_end_lengths(df: pd.DataFrame, folder: str="general_analysis")-> None:
     '''
         plots the difference of the start and end lengths of the DelVG RNA
         sequences as a violinplot (3' = start, 5' = end).
-        :param dfs: The list of DataFrames containing the data, preprocessed
-            with sequence_df(df)
-        :param dfnames: The names associated with each DataFrame in `dfs`
+        :param df: Pandas DataFrame with the DelVGs of all datasets, created
+            by to_long_format()
         :param folder: defines where to save the results
     
         :return: None  
     '''
     fig, axs = plt.subplots(1, 1, figsize=(10, 4), tight_layout=True)
     thresh = 300
-    plot_list, labels = calc_start_end_lengths(dfs, dfnames, thresh)
+    plot_list, labels = calc_start_end_lengths(df, thresh)
 
-    position_list = np.arange(0, len(dfs))
+    position_list = np.arange(0, len(plot_list))
     violin_parts = axs.violinplot(plot_list, position_list, showextrema=False, points=1000, showmeans=True, vert=True)
     for pc in violin_parts["bodies"]:
         pc.set_edgecolor("black")
@@ -388,7 +386,7 @@ def diff_start_end_lengths(dfs: list, dfnames: list, folder: str="general_analys
     axs.set_xticks(position_list)
     labels = [f"{l}   " for l in labels]
     axs.set_xticklabels(labels, rotation=90)
-    axs.set_xlim(left=-0.5, right=len(dfs)-0.5)
+    axs.set_xlim(left=-0.5, right=len(plot_list)-0.5)
     axs.set_yticks(range(-300, 301, 150))
     axs.set_ylabel("3'-end length - 5'-end length              ")
 
@@ -399,24 +397,26 @@ def diff_start_end_lengths(dfs: list, dfnames: list, folder: str="general_analys
     plt.close()
 
 
-def plot_nucleotide_ratio_around_deletion_junction_heatmaps(dfs: list, dfnames: list, folder: str="general_analysis")-> None:
+def plot_nucleotide_ratio_around_deletion_junction_heatmaps(df: pd.DataFrame, folder: str="general_analysis")-> None:
     '''
         plot heatmaps of nucleotide ratios around deletion junctions.
-        :param dfs: The list of DataFrames containing the data, preprocessed
-            with sequence_df(df)
-        :param dfnames: The names associated with each DataFrame in `dfs`
+        :param df: Pandas DataFrame with the DelVGs of all datasets, created
+            by to_long_format()
         :param folder: defines where to save the results
     
         :return: None
     '''
-    fig, axs = plt.subplots(figsize=(13, len(dfs)), nrows=2, ncols=2)
+    dfnames = get_group_names(df)
+    groups = df.groupby("dataset", observed=True).indices
+    sizes = dict({dfname: len(groups[dfname]) for dfname in dfnames})
+    fig, axs = plt.subplots(figsize=(13, len(dfnames)), nrows=2, ncols=2)
     axs = axs.flatten()
+    probability_matrices = [create_nucleotide_ratio_matrix(df.iloc[groups[dfname]], "seq_around_deletion_junction") for dfname in dfnames]
     for i, nuc in enumerate(NUCLEOTIDES.keys()):
         x = list()
         y = list()
         vals = list()
-        for dfname, df in zip(dfnames, dfs):
-            probability_matrix = create_nucleotide_ratio_matrix(df, "seq_around_deletion_junction")
+        for dfname, probability_matrix in zip(dfnames, probability_matrices):
             for j in probability_matrix.index:
                 x.append(j)
                 y.append(dfname)
@@ -434,7 +434,7 @@ def plot_nucleotide_ratio_around_deletion_junction_heatmaps(dfs: list, dfnames:
         quarter = len(probability_matrix.index) // 4
         indexes = [pos for pos in range(1, quarter * 2 + 1)]
         if i % 2 == 0:
-            axs[i].set_yticklabels([f"{dfname} ({len(df)})" for dfname, df in zip(dfnames, dfs)])
+            axs[i].set_yticklabels([f"{dfname} ({sizes[dfname]})" for dfname in dfnames])
         else:
             axs[i].set_yticklabels([])
         if i < 2:
@@ -458,38 +458,30 @@ def plot_nucleotide_ratio_around_deletion_junction_heatmaps(dfs: list, dfnames:
     plt.close()
 
 
-def plot_direct_repeat_ratio_heatmaps(dfs: list, dfnames: list, folder: str="general_analysis")-> None:
+def plot_direct_repeat_ratio_heatmaps(df: pd.DataFrame, folder: str="general_analysis")-> None:
     '''
         plot heatmaps of nucleotide ratios around deletion junctions.
-        :param dfs: The list of DataFrames containing the data, preprocessed
-            with sequence_df(df)
-        :param dfnames: The names associated with each DataFrame in `dfs`
+        :param df: Pandas DataFrame with the DelVGs of all datasets, created
+            by to_long_format()
         :param folder: defines where to save the results
     
         :return: None
     '''
-    fig, axs = plt.subplots(figsize=(10, len(dfs)/2))
+    dfnames = get_group_names(df)
+    sizes = df.groupby("dataset", observed=True).size()
+    fig, axs = plt.subplots(figsize=(10, len(dfnames)/2))
+    final_d = dict({dfname: np.zeros(6) for dfname in dfnames})
+    for (dfname, st, s), idx in df.groupby(["dataset", "Strain", "Segment"], observed=True).indices.items():
+        counts, _ = count_direct_repeats_overall(df.iloc[idx], get_sequence(st, s))
+        final_d[dfname] += np.array(list(counts.values()))
+
     x = list()
     y = list()
     vals = list()
-    for dfname, df in zip(dfnames, dfs):
-        final_d = dict()
-        for s in SEGMENTS:
-            df_s = df[df["Segment"] == s]
-            if len(df_s) == 0:
-                continue
-            seq = get_sequence(df_s["Strain"].unique()[0], s)
-            counts, _ = count_direct_repeats_overall(df_s, seq)
-            for k, v in counts.items():
-                if k in final_d:
-                    final_d[k] += v
-                else:
-                    final_d[k] = v
-
-        x.extend(final_d.keys())
-        y.extend([f"{dfname} ({len(df)})" for _ in range(6)])
-        final = np.array(list(final_d.values()))
-        vals.extend(final/final.sum())
+    for dfname in dfnames:
+        x.extend(range(6))
+        y.extend([f"{dfname} ({sizes[dfname]})" for _ in range(6)])
+        vals.extend(final_d[dfname]/final_d[dfname].sum())
 
     axs = plot_heatmap(x,y,vals, axs, vmin=0, vmax=1, cbar=True, format=".5f")
     axs.set_title("direct repeat ratios around deletion junction")
@@ -509,45 +501,53 @@ def plot_direct_repeat_ratio_heatmaps(dfs: list, dfnames: list, folder: str="gen
     plt.close()
 
 
-def nucleotide_pair_table(dfs: list, dfnames: list, folder: str="general_analysis")-> None:
+def nucleotide_pair_table(df: pd.DataFrame, folder: str="general_analysis")-> None:
     '''
         calcualte the motifs of specified length before start and end of
         deletion site.
-        :param dfs: The list of DataFrames containing the data, preprocessed
-            with sequence_df(df)
-        :param dfnames: The names associated with each DataFrame in `dfs`
+        :param df: Pandas DataFrame with the DelVGs of all datasets, created
+            by to_long_format()
         :param folder: defines where to save the results
     
         :return: None
     '''
+    starts = df["Start"].to_numpy(dtype=np.int64)
+    ends = df["End"].to_numpy(dtype=np.int64)
+    s_motifs = np.empty(len(df), dtype=object)
+    e_motifs = np.empty(len(df), dtype=object)
+    for (st, seg), idx in df.groupby(["Strain", "Segment"], sort=False, observed=True).indices.items():
+        seq = get_sequence(st, seg)
+        s_idx = starts[idx]
+        e_idx = ends[idx]
+        # two nucleotides before the start and before the end of the deletion
+        regular = (s_idx >= 2) & (s_idx <= len(seq)) & (e_idx >= 3) & (e_idx - 1 <= len(seq))
+        seq_arr = np.frombuffer(seq.encode("ascii"), dtype=np.uint8)
+        for motifs, pos in [(s_motifs, s_idx - 2), (e_motifs, e_idx - 3)]:
+            pairs = seq_arr[pos[regular, None] + np.arange(2)].copy().view("S2").ravel()
+            motifs[idx[regular]] = pairs.astype(str)
+        # at the borders of the sequence fall back to slicing
+        for i in np.flatnonzero(~regular):
+            s, e = s_idx[i], e_idx[i]
+            s_motifs[idx[i]] = seq[s-2:s+2][:2]
+            e_motifs[idx[i]] = seq[e-(2+1):e+(2-1)][:2]
+
+    def most_common(motifs):
+        # like Counter.most_common(1), ties go to the motif seen first
+        motif_df = pd.DataFrame({"dataset": df["dataset"].to_numpy(), "motif": motifs, "pos": np.arange(len(df))})
+        counts = motif_df.groupby(["dataset", "motif"], observed=True)["pos"].agg(["size", "min"]).reset_index()
+        counts = counts.sort_values(["dataset", "size", "min"], ascending=[True, False, True])
+        return counts.drop_duplicates("dataset").set_index("dataset")
+
+    n = df.groupby("dataset", observed=True).size().reindex(get_group_names(df))
+    start_motifs = most_common(s_motifs).reindex(n.index)
+    end_motifs = most_common(e_motifs).reindex(n.index)
     results = dict({
-        "name": dfnames,
-        "start": list(),
-        "start prct.": list(),
-        "end": list(),
-        "end prct.": list()
+        "name": n.index.to_list(),
+        "start": start_motifs["motif"].to_list(),
+        "start prct.": (start_motifs["size"] / n * 100).round(1).to_list(),
+        "end": end_motifs["motif"].to_list(),
+        "end prct.": (end_motifs["size"] / n * 100).round(1).to_list()
     })
-    for df in dfs:
-        s_motifs = list()
-        e_motifs = list()
-        for _, r in df.iterrows():
-            seq = r["full_seq"]
-            s = r["Start"]
-            e = r["End"]
-            s_motif = seq[s-2:s+2]
-            e_motif = seq[e-(2+1):e+(2-1)]
-            s_motifs.append(s_motif[:2])
-            e_motifs.append(e_motif[:2])
-
-        s_motifs_counts = Counter(s_motifs)
-        start_motif = s_motifs_counts.most_common(1)[0]
-        e_motifs_counts = Counter(e_motifs)
-        end_motif = e_motifs_counts.most_common(1)[0]
-
-        results["start"].append(start_motif[0])
-        results["start prct."].append(round(start_motif[1]/df.shape[0] * 100, 1))
-        results["end"].append(end_motif[0])
-        results["end prct."].append(round(end_motif[1]/df.shape[0] * 100, 1))
 
     results_df = pd.DataFrame(results)
 
@@ -562,19 +562,52 @@ def nucleotide_pair_table(dfs: list, dfnames: list, folder: str="general_analysi
     results_df.to_csv(os.path.join(save_path, "deletion_site_motif.csv"), index=False)
 
 
+def bootstrap_profile_tables(df: pd.DataFrame, n_boot: int=1000, weighted: bool=False, folder: str="general_analysis")-> None:
+    '''
+        Saves bootstrap confidence intervals of the nucleotide ratios around
+        the deletion junctions and of the direct repeat ratios, shown in the
+        heatmaps of plot_nucleotide_ratio_around_deletion_junction_heatmaps()
+        and plot_direct_repeat_ratio_heatmaps().
+        :param df: Pandas DataFrame with the DelVGs of all datasets, created
+            by to_long_format()
+        :param n_boot: number of bootstrap replicates
+        :param weighted: if True the DelVGs are resampled weighted by their
+            NGS count
+        :param folder: defines where to save the results
+
+        :return: None
+    '''
+    nuc_dfs = list()
+    dr_dfs = list()
+    groups = df.groupby("dataset", observed=True).indices
+    for dfname in get_group_names(df):
+        nuc_df, dr_df = bootstrap_profiles(df.iloc[groups[dfname]], n_boot, weighted)
+        nuc_df.insert(0, "dataset", dfname)
+        dr_df.insert(0, "dataset", dfname)
+        nuc_dfs.append(nuc_df)
+        dr_dfs.append(dr_df)
+
+    save_path = os.path.join(RESULTSPATH, folder)
+    if not os.path.exists(save_path):
+        os.makedirs(save_path)
+    suffix = "_weighted" if weighted else ""
+    pd.concat(nuc_dfs, ignore_index=True).to_csv(os.path.join(save_path, f"nuc_occ_bootstrap{suffix}.csv"), index=False)
+    pd.concat(dr_dfs, ignore_index=True).to_csv(os.path.join(save_path, f"dir_rep_bootstrap{suffix}.csv"), index=False)
+
+
 if __name__ == "__main__":
     plt.style.use("seaborn")
     
     dfnames = get_dataset_names(cutoff=40)
-    dfs, _ = load_all(dfnames)
+    df, _ = load_all(dfnames, long_format=True)
     
-    plot_distribution_over_segments(dfs, dfnames)
-    calculate_deletion_shifts(dfs, dfnames)
-    length_distribution_histrogram(dfs, dfnames)
-    length_distribution_violinplot(dfs, dfnames)
-    plot_nucleotide_ratio_around_deletion_junction_heatmaps(dfs, dfnames)
-    plot_direct_repeat_ratio_heatmaps(dfs, dfnames)
-    start_vs_end_lengths(dfs, dfnames, limit=600)
-    diff_start_end_lengths(dfs, dfnames)
-    nucleotide_pair_table(dfs, dfnames)
-    
\ No newline at end of file
+    plot_distribution_over_segments(df)
+    calculate_deletion_shifts(df)
+    length_distribution_histrogram(df)
+    length_distribution_violinplot(df)
+    plot_nucleotide_ratio_around_deletion_junction_heatmaps(df)
+    plot_direct_repeat_ratio_heatmaps(df)
+    bootstrap_profile_tables(df)
+    start_vs_end_lengths(df, limit=600)
+    diff_start_end_lengths(df)
+    nucleotide_pair_table(df)
@@ -1,5 +1,11 @@
 
 
+echo "Data preparation"
+cd data_preparation
+python build_genome_archive.py
+python ingest_datasets.py
+cd ..
+
 echo "Metadata"
 cd metadata
 python metadata.py
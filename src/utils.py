@@ -2,14 +2,20 @@
     General functions and global parameters, that are used in different scripts
 '''
 import os
+import json
+import mmap
+import hashlib
+import warnings
 
 import numpy as np
 import pandas as pd
 import seaborn as sns
 import scipy.stats as stats
+import scipy.sparse as sparse
 
 from typing import Tuple
 from Bio import SeqIO
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 ### STATIC VALUES ###
 # load config and assign values to global variables
@@ -20,9 +26,22 @@ RESULTSPATH = "/home/jens/DIPs/DIP_meta/results"
 CMAP = "Accent"
 CUTOFF = 15
 N_SAMPLES = 35000
+# seed for sampling the expected data, part of the key of its cache
+SEED = 42
+# increase when the generation of the expected data changes
+EXPECTED_CACHE_VERSION = 2
+# adaptive sampling of the expected data, see generate_sampling_data_adaptive()
+ADAPTIVE_BATCH_SIZE = 1000
+ADAPTIVE_TOLERANCE = 0.002
+ADAPTIVE_MAX_SAMPLES = 50000
+N_WORKERS = os.cpu_count() or 1
 RESULTSPATH = os.path.join(RESULTSPATH, f"cutoff_{CUTOFF}")
 SEGMENTS = list(["PB2", "PB1", "PA", "HA", "NP", "NA", "M", "NS"])
 NUCLEOTIDES = dict({"A": "Adenine", "C": "Cytosin", "G": "Guanine", "U": "Uracil"})
+SEQUENCE_COLUMNS = list(["full_seq", "deleted_sequence", "seq_around_deletion_junction"])
+# layout of the int64 DelVG keys, see encode_keys()
+KEY_POSITION_BITS = 24
+KEY_SEGMENT_SHIFT = 2 * KEY_POSITION_BITS
 
 
 DATASET_STRAIN_DICT = dict({
@@ -55,6 +74,17 @@ DATASET_STRAIN_DICT = dict({
     "Valesano2020_Yam": "Yamagata"
 })
 
+# cultivation types and virus types of the datasets, see get_dataset_names()
+CULTIVATION_TYPES = list(["in vitro", "in vivo mouse", "in vivo human"])
+VIRUS_TYPES = list(["IAV", "IBV"])
+DATASET_SELECTIONS = dict({
+    "in vivo mouse": ["Wang2023", "Penn2022", "Lui2019"],
+    "in vitro": ["Alnaji2021", "Pelz2021", "Wang2020", "Kupke2020", "Zhuravlev2020", "VdHoecke2015", "Alnaji2019_Cal07" ,"Alnaji2019_NC", "Mendes2021", "Boussier2020", "Alnaji2019_Perth", "Alnaji2019_BLEE", "Sheng2018"],
+    "in vivo human": ["Berry2021_A", "Berry2021_B", "Berry2021_B_Yam", "Southgate2019", "Valesano2020_Yam", "Valesano2020_Vic"],
+    "IAV": ["Alnaji2021", "Pelz2021", "Wang2023", "Wang2020", "Kupke2020", "Zhuravlev2020", "VdHoecke2015", "Alnaji2019_Cal07", "Alnaji2019_NC", "Mendes2021", "Boussier2020", "Alnaji2019_Perth", "Berry2021_A", "Penn2022", "Lui2019"],
+    "IBV": ["Alnaji2019_BLEE", "Berry2021_B", "Valesano2020_Vic", "Sheng2018", "Berry2021_B_Yam", "Southgate2019","Valesano2020_Yam"]
+})
+
 ACCNUMDICT = dict({
     "Wang2023": dict({
         "SRR16770171" : dict({"IFNAR": "1", "IFNLR": "0", "Replicate": "1"}),
@@ -694,7 +724,7 @@ def get_dataset_names(cutoff: int=0, selection: str="")-> list:
         Allows to select dataset names based on their cultivation type.
         :param cutoff: Threshold for min number of DelVGs in each dataset
         :param selection: cultivation type either 'in vivo mouse', 'in vitro'
-                         or 'in vivo human'
+                         or 'in vivo human' or virus type 'IAV' or 'IBV'
         
         :return: list of dataset names
     '''
@@ -706,25 +736,257 @@ def get_dataset_names(cutoff: int=0, selection: str="")-> list:
     names = df[df["Size"] >= cutoff]["Dataset"].to_list()
 
     # make selection based on in vivo/cells etc.
-    if selection == "in vivo mouse":
-        select_names = ["Wang2023", "Penn2022", "Lui2019"]
-    elif selection == "in vitro":
-        select_names = ["Alnaji2021", "Pelz2021", "Wang2020", "Kupke2020", "Zhuravlev2020", "VdHoecke2015", "Alnaji2019_Cal07" ,"Alnaji2019_NC", "Mendes2021", "Boussier2020", "Alnaji2019_Perth", "Alnaji2019_BLEE", "Sheng2018"]
-    elif selection == "in vivo human":
-        select_names = ["Berry2021_A", "Berry2021_B", "Berry2021_B_Yam", "Southgate2019", "Valesano2020_Yam", "Valesano2020_Vic"]
-    elif selection == "IAV":
-        select_names = ["Alnaji2021", "Pelz2021", "Wang2023", "Wang2020", "Kupke2020", "Zhuravlev2020", "VdHoecke2015", "Alnaji2019_Cal07", "Alnaji2019_NC", "Mendes2021", "Boussier2020", "Alnaji2019_Perth", "Berry2021_A", "Penn2022", "Lui2019"]
-    elif selection == "IBV":
-        select_names = ["Alnaji2019_BLEE", "Berry2021_B", "Valesano2020_Vic", "Sheng2018", "Berry2021_B_Yam", "Southgate2019","Valesano2020_Yam"]
-    else:
-        select_names = names
+    select_names = DATASET_SELECTIONS.get(selection, names)
 
     names = [name for name in names if name in select_names]
     return names
 
+##########################
+### DATASET CONTAINERS ###
+##########################
+def get_container_path(dataset: str)-> Tuple[str, str]:
+    '''
+        Gives the paths of the columnar container of a dataset and of its
+        manifest.
+        :param dataset: name of the experiment (is also folder name)
+
+        :return: Tuple
+            path to the parquet file
+            path to the manifest file
+    '''
+    folder = os.path.join(DATAPATH, dataset)
+    return os.path.join(folder, f"{dataset}.parquet"), os.path.join(folder, f"{dataset}_manifest.json")
+
+def get_mapped_reads_path(experiment: str, acc: str)-> str:
+    '''
+        Gives the path to the file with the mapped reads per segment of a
+        single SRA accession number.
+        :param experiment: name of the experiment (is also folder name)
+        :param acc: SRA accession number
+
+        :return: path to the csv file
+    '''
+    path = os.path.join(DATAPATH, experiment, f"{acc}_mapped_reads_per_segment.csv")
+    if not os.path.exists(path):
+        path = os.path.join(DATAPATH, experiment, f"{acc}both_mapped_reads_per_segment.csv")
+    return path
+
+def read_accession_csv(exp: str, acc: str)-> pd.DataFrame:
+    '''
+        Reads the csv file of a single SRA accession number. The segment ids
+        of the reference fastas are not replaced.
+        :param exp: name of the experiment (is also folder name)
+        :param acc: SRA accession number
+
+        :return: Pandas Dataframe with one DelVG population
+    '''
+    path = os.path.join(DATAPATH, exp, f"{exp}_{acc}.csv")
+    return pd.read_csv(path,
+                       dtype={"Segment": "string", "Start": "int64", "End": "int64", "NGS_read_count": "int64"},
+                       na_values=["", "None"],
+                       keep_default_na=False)
+
+def read_mapped_reads_csv(experiment: str, acc: str)-> pd.DataFrame:
+    '''
+        Reads the mapped reads per segment of a single SRA accession number.
+        :param experiment: name of the experiment (is also folder name)
+        :param acc: SRA accession number
+
+        :return: Pandas DataFrame with mapped reads per segment
+    '''
+    path = get_mapped_reads_path(experiment, acc)
+    return pd.read_csv(path, dtype={"counts":"int64","segment": "string"}, na_values=["", "None"], keep_default_na=False)
+
+def get_metadata_keys(dataset: str)-> list:
+    '''
+        Gives the names of the metadata columns of a dataset in ACCNUMDICT.
+        :param dataset: name of the experiment
+
+        :return: list with the names of the metadata columns
+    '''
+    return list(dict.fromkeys(k for meta in ACCNUMDICT[dataset].values() for k in meta.keys()))
+
+def get_file_signature(path: str)-> list:
+    '''
+        Gives size and modification time of a file, used to detect changes.
+        :param path: path to the file
+
+        :return: list with size and modification time in ns, None if the file
+            does not exist
+    '''
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def get_source_signatures(dataset: str, acc: str)-> dict:
+    '''
+        Gives the signatures of the csv files a container is built from for
+        a single SRA accession number, see get_file_signature().
+        :param dataset: name of the experiment (is also folder name)
+        :param acc: SRA accession number
+
+        :return: dictionary with the signature of the DelVG file ("delvg")
+            and of the mapped reads file ("mapped_reads")
+    '''
+    return dict({
+        "delvg": get_file_signature(os.path.join(DATAPATH, dataset, f"{dataset}_{acc}.csv")),
+        "mapped_reads": get_file_signature(get_mapped_reads_path(dataset, acc))
+    })
+
+def build_dataset_container(dataset: str)-> Tuple[str, int]:
+    '''
+        Converts all csv files of a dataset into one parquet file. It holds
+        the DelVGs (Table == "delvg") and the mapped reads per segment
+        (Table == "mapped_reads") of all SRA accession numbers together with
+        the accession number and the metadata of ACCNUMDICT. A manifest with
+        size and modification time of the source files is written next to it.
+        Only accession numbers whose source files changed are read again.
+        :param dataset: name of the experiment (is also folder name)
+
+        :return: Tuple
+            path to the parquet file
+            number of accession numbers that were read from the csv files
+    '''
+    path, manifest_path = get_container_path(dataset)
+    acc_nums = ACCNUMDICT[dataset]
+    old_manifest = dict({"accessions": dict()})
+    old_df = None
+    if os.path.exists(path) and os.path.exists(manifest_path):
+        with open(manifest_path, "r") as f:
+            old_manifest = json.load(f)
+        old_df = pd.read_parquet(path)
+
+    # column names and dtypes of the two tables, to restore them when reading
+    manifest = dict({
+        "accessions": dict(),
+        "delvg_columns": old_manifest.get("delvg_columns", dict()),
+        "mapped_reads_columns": old_manifest.get("mapped_reads_columns", dict())
+    })
+    dfs = list()
+    n_rebuilt = 0
+    for acc_num, meta in acc_nums.items():
+        sources = get_source_signatures(dataset, acc_num)
+        manifest["accessions"][acc_num] = sources
+        if old_df is not None and old_manifest["accessions"].get(acc_num) == sources:
+            dfs.append(old_df[old_df["Accession"] == acc_num])
+            continue
+
+        n_rebuilt += 1
+        tables = [(read_accession_csv(dataset, acc_num), "delvg")]
+        if sources["mapped_reads"] is not None:
+            tables.append((read_mapped_reads_csv(dataset, acc_num), "mapped_reads"))
+        for df, table in tables:
+            manifest[f"{table}_columns"] = dict({c: str(t) for c, t in df.dtypes.items()})
+            df["Table"] = table
+            df["Accession"] = acc_num
+            for key in meta.keys():
+                df[key] = meta[key]
+            dfs.append(df)
+
+    container_df = pd.concat(dfs, ignore_index=True)
+    for col in ["Table", "Accession"] + get_metadata_keys(dataset):
+        container_df[col] = container_df[col].astype("category")
+
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    container_df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=1)
+    return path, n_rebuilt
+
+def read_dataset_container(dataset: str, table: str, acc: str=None)-> pd.DataFrame:
+    '''
+        Reads one table of the container of a dataset.
+        :param dataset: name of the experiment (is also folder name)
+        :param table: either "delvg" or "mapped_reads"
+        :param acc: SRA accession number, if None all accession numbers are
+            returned
+
+        :return: Pandas DataFrame with the data, None if no container exists,
+            it does not match the accession numbers in ACCNUMDICT or one of
+            the csv files changed since it was built
+    '''
+    path, manifest_path = get_container_path(dataset)
+    if not (os.path.exists(path) and os.path.exists(manifest_path)):
+        return None
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+    if list(manifest["accessions"].keys()) != list(ACCNUMDICT[dataset].keys()):
+        return None
+    # the container is outdated if a source file was edited, the csv files
+    # are read instead until ingest_datasets.py is run again
+    acc_nums = manifest["accessions"].keys() if acc is None else [acc]
+    for acc_num in acc_nums:
+        sources = manifest["accessions"].get(acc_num, dict())
+        if sources.get(table) != get_source_signatures(dataset, acc_num)[table]:
+            return None
+
+    filters = [("Table", "==", table)]
+    dtypes = manifest[f"{table}_columns"]
+    columns = list(dtypes.keys())
+    if acc is None:
+        columns = columns + ["Accession"] + get_metadata_keys(dataset)
+    else:
+        filters.append(("Accession", "==", acc))
+    df = pd.read_parquet(path, columns=columns, filters=filters).astype(dtypes)
+    if acc is None:
+        df["Accession"] = df["Accession"].cat.remove_unused_categories()
+    return df
+
+def get_file_hash(path: str)-> str:
+    '''
+        Calculates the sha256 hash of a file, used to detect changes of files
+        that are not part of a dataset.
+        :param path: path to the file
+
+        :return: hex digest of the file content
+    '''
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def read_table_cached(path: str, sheet_name: object=0, **kwargs)-> pd.DataFrame:
+    '''
+        Reads an excel sheet or a csv/tsv file and keeps a parquet copy of it
+        in the folder "parquet_cache" next to the file. The copy is keyed by
+        the hash of the source file and the read options, later calls read the
+        copy as long as the source file is unchanged.
+        :param path: path to the .xlsx, .csv or .tsv file
+        :param sheet_name: sheet to read from an excel file
+        :param kwargs: further arguments for pd.read_excel or pd.read_csv
+
+        :return: Pandas DataFrame with the content of the table
+    '''
+    is_excel = path.endswith(".xlsx")
+    options = dict(kwargs, sheet_name=sheet_name) if is_excel else dict(kwargs)
+    key = hashlib.sha256(json.dumps([get_file_hash(path), options], sort_keys=True, default=str).encode()).hexdigest()[:16]
+    folder = os.path.join(os.path.dirname(path), "parquet_cache")
+    stem = os.path.splitext(os.path.basename(path))[0]
+    cache_path = os.path.join(folder, f"{stem}_{key}.parquet")
+    if os.path.exists(cache_path):
+        return pd.read_parquet(cache_path)
+
+    df = pd.read_excel(path, **options) if is_excel else pd.read_csv(path, **options)
+    os.makedirs(folder, exist_ok=True)
+    tmp_path = f"{cache_path}.tmp{os.getpid()}"
+    try:
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, cache_path)
+    except (ValueError, TypeError) as err:
+        # columns with mixed types can not be stored, the table is read from
+        # the source file next time again
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        warnings.warn(f"{path} is not cached as parquet and is read from the source file every time: {err}")
+    return df
+
 def load_single_dataset(exp: str, acc: str, segment_dict: dict)-> pd.DataFrame:
     '''
-        Load a single dataset, defined by one SRA accession number.
+        Load a single dataset, defined by one SRA accession number. Is read
+        from the container of the experiment if it exists.
         :param exp: name of the experiment (is also folder name)
         :param acc: SRA accession number
         :param segment_dict: dictionary that maps the ids of the reference
@@ -732,64 +994,183 @@ def load_single_dataset(exp: str, acc: str, segment_dict: dict)-> pd.DataFrame:
 
         :return: Pandas Dataframe with one DelVG population
     '''
-    path = os.path.join(DATAPATH, exp, f"{exp}_{acc}.csv")
-    df = pd.read_csv(path,
-                     dtype={"Segment": "string", "Start": "int64", "End": "int64", "NGS_read_count": "int64"},
-                     na_values=["", "None"],
-                     keep_default_na=False)
+    df = read_dataset_container(exp, "delvg", acc) if exp in ACCNUMDICT else None
+    if df is None:
+        df = read_accession_csv(exp, acc)
     df["Segment"] = df["Segment"].replace(segment_dict)
 
     return df
 
-def load_dataset(dataset: str)-> pd.DataFrame:
+def load_dataset(dataset: str, workers: int=1)-> pd.DataFrame:
     '''
-        Load a full dataset, defined by multiple SRA accession numbers.
-        :param exp: name of the experiment (is also folder name)
+        Load a full dataset, defined by multiple SRA accession numbers. Is
+        read from the container of the experiment if it exists.
+        :param dataset: name of the experiment (is also folder name)
+        :param workers: number of threads used to read the accession files,
+            should stay 1 when called from a process pool
 
         :return: Pandas Dataframe with one DelVG population of whole experiment
     '''
     acc_nums = ACCNUMDICT[dataset]
     strain = DATASET_STRAIN_DICT[dataset]
-    dfs = list()
-    for acc_num, meta in acc_nums.items():
+    concat_df = read_dataset_container(dataset, "delvg")
+    if concat_df is not None:
+        concat_df["Segment"] = concat_df["Segment"].replace(SEGMENT_DICTS[strain])
+        return concat_df
+
+    def load_accession(acc_num):
         df = load_single_dataset(dataset, acc_num, SEGMENT_DICTS[strain])
+        df["Accession"] = acc_num
+        meta = acc_nums[acc_num]
         for key in meta.keys():
             df[key] = meta[key]
-        dfs.append(df)
-    concat_df = pd.concat(dfs)
+        return df
+
+    if workers > 1 and len(acc_nums) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            dfs = list(executor.map(load_accession, acc_nums.keys()))
+    else:
+        dfs = [load_accession(acc_num) for acc_num in acc_nums.keys()]
+    concat_df = pd.concat(dfs, ignore_index=True)
+    for col in ["Accession"] + get_metadata_keys(dataset):
+        concat_df[col] = concat_df[col].astype("category")
 
     return concat_df
 
-def load_all(dfnames: list, expected: str=False)-> Tuple[list, list]:
+def load_and_preprocess(dfname: str, expected: str=False, workers: int=1, compact: bool=False, expected_mode: str="sampled")-> Tuple[pd.DataFrame, object]:
+    '''
+        Load and preprocess a single dataset. Is run for each dataset by
+        load_all().
+        :param dfname: name of the dataset
+        :param expected: if True, expected data is loaded additionally
+        :param workers: number of threads used to read the accession files
+            and of processes used to generate the expected data
+        :param compact: if True the DataFrames are returned without sequence
+            columns, see compact_delvg_df()
+        :param expected_mode: "sampled" for N_SAMPLES randomly sampled
+            expected DelVGs per segment, "adaptive" to choose the number of
+            samples per segment by generate_sampling_data_adaptive(), "exact"
+            for the distributions of generate_expected_distributions()
+
+        :return: Tuple
+            Pandas DataFrame with the preprocessed dataset
+            Pandas DataFrame with the expected data or Dict with the exact
+                expected distributions, None if not requested
     '''
-        Load a list of datasets.
+    strain = DATASET_STRAIN_DICT[dfname]
+    df = join_data(load_dataset(dfname, workers=workers))
+    exp_df = None
+    if expected and expected_mode == "exact":
+        df_t = df[df["NGS_read_count"] >= CUTOFF]
+        exp_df = generate_expected_distributions(strain, df_t)
+    elif expected:
+        df_t = df[df["NGS_read_count"] >= CUTOFF].copy()
+        adaptive = expected_mode == "adaptive"
+        exp_df = preprocess(strain, load_expected_data(dfname, strain, df_t, workers=workers, adaptive=adaptive), 1, compact)
+    return preprocess(strain, df, CUTOFF, compact), exp_df
+
+def load_all(dfnames: list, expected: str=False, workers: int=1, compact: bool=False, expected_mode: str="sampled", long_format: bool=False)-> Tuple[object, object]:
+    '''
+        Load a list of datasets. The datasets are processed in parallel if
+        more than one worker is given.
         :param dfnames: list of dataset names, each is one experiment
         :param expected: if True, expected data is loaded additionally
+        :param workers: number of processes used for the datasets, if only
+            one dataset is loaded it is used for the threads reading the
+            accession files and the processes generating the expected data
+        :param compact: if True the DataFrames are returned without sequence
+            columns, see compact_delvg_df()
+        :param expected_mode: "sampled" for N_SAMPLES randomly sampled
+            expected DelVGs per segment, "adaptive" to choose the number of
+            samples per segment by generate_sampling_data_adaptive(), "exact"
+            for the distributions of generate_expected_distributions()
+        :param long_format: if True the datasets are returned as one
+            DataFrame, see to_long_format()
 
         :return: Tuple
-            List of Pandas Dataframes each containing one experiment
-            List of dataset names in same order as first list
+            List of Pandas Dataframes each containing one experiment, or one
+                DataFrame with all experiments if long_format is True
+            List with the expected data of each experiment, or one DataFrame
+                with all expected data if long_format is True. In the "exact"
+                mode a Dict with the distributions of each experiment, keyed
+                by its name. None if no expected data is loaded
     '''
-    dfs = list()
-    expected_dfs = list()
-    for dfname in dfnames:
-        strain = DATASET_STRAIN_DICT[dfname]
-        df = join_data(load_dataset(dfname))
-        dfs.append(preprocess(strain, df, CUTOFF))
-        if expected:
-            f = os.path.join(DATAPATH, "random_sampled", f"{dfname}_{CUTOFF}.csv")
-            if os.path.exists(f):
-                dtypes = {"Start": int, "End": int, "Segment": str, "NGS_read_count": int,
-                          "key": str, "Strain": str, "isize": int, "full_seq": str,
-                          "deleted_sequence": str, "seq_around_deletion_junction": str}
-                exp_df = pd.read_csv(f, dtype=dtypes)
-            else:
-                df = df[df["NGS_read_count"] >= CUTOFF].copy()
-                exp_df = preprocess(strain, generate_expected_data(strain, df), 1)
-                exp_df.to_csv(f, index=False)
-            expected_dfs.append(exp_df)
+    n_processes = min(workers, len(dfnames))
+    if n_processes > 1:
+        # each dataset is loaded sequentially inside its process, nested
+        # pools would start more workers than there are CPUs
+        with ProcessPoolExecutor(max_workers=n_processes) as executor:
+            results = list(executor.map(load_and_preprocess, dfnames, [expected] * len(dfnames), [1] * len(dfnames), [compact] * len(dfnames), [expected_mode] * len(dfnames)))
+    else:
+        results = [load_and_preprocess(dfname, expected, workers, compact, expected_mode) for dfname in dfnames]
+
+    dfs = [df for df, _ in results]
+    if expected and expected_mode == "exact":
+        # the exact distributions are no DataFrames, they are kept per dataset
+        expected_dfs = dict({dfname: exp_dict for dfname, (_, exp_dict) in zip(dfnames, results)})
+    else:
+        expected_dfs = [exp_df for _, exp_df in results if exp_df is not None]
+    if long_format:
+        exp_long = expected_dfs if expected and expected_mode == "exact" else None
+        if expected and expected_mode != "exact":
+            exp_long = to_long_format(expected_dfs, dfnames)
+        return to_long_format(dfs, dfnames), exp_long
     return dfs, expected_dfs
 
+def to_long_format(dfs: list, dfnames: list)-> pd.DataFrame:
+    '''
+        Combines a list of datasets into one DataFrame. The name of the
+        dataset, its cultivation type and virus type (see DATASET_SELECTIONS)
+        are added as categorical columns "dataset", "cultivation" and "virus".
+        The categories of "dataset" are in the order of dfnames, so grouped
+        results keep this order.
+        :param dfs: list of datasets, ordered as in dfnames
+        :param dfnames: list of dataset names, each is one experiment
+
+        :return: Pandas DataFrame with the DelVGs of all datasets
+    '''
+    def type_codes(types):
+        codes = list()
+        for dfname in dfnames:
+            matches = [i for i, t in enumerate(types) if dfname in DATASET_SELECTIONS[t]]
+            codes.append(matches[0] if len(matches) > 0 else -1)
+        return np.repeat(np.array(codes, dtype=np.int64), sizes)
+
+    sizes = [df.shape[0] for df in dfs]
+    long_df = pd.concat(dfs, ignore_index=True)
+    long_df["dataset"] = pd.Categorical.from_codes(np.repeat(np.arange(len(dfnames)), sizes), categories=list(dfnames))
+    long_df["cultivation"] = pd.Categorical.from_codes(type_codes(CULTIVATION_TYPES), categories=CULTIVATION_TYPES)
+    long_df["virus"] = pd.Categorical.from_codes(type_codes(VIRUS_TYPES), categories=VIRUS_TYPES)
+    return long_df
+
+def get_group_names(df: pd.DataFrame, by: str="dataset")-> list:
+    '''
+        Gives the groups of a categorical column that occur in a DataFrame
+        created by to_long_format(), in the order of the categories.
+        :param df: Pandas DataFrame with the DelVGs of multiple datasets
+        :param by: column to group by
+
+        :return: list of group names
+    '''
+    present = set(df[by].unique())
+    return [c for c in df[by].cat.categories if c in present]
+
+def sort_long_format_by_type(df: pd.DataFrame, cutoff: int)-> pd.DataFrame:
+    '''
+        Orders the datasets of a DataFrame created by to_long_format() by
+        cultivation type, like sort_datasets_by_type().
+        :param df: Pandas DataFrame with the DelVGs of multiple datasets
+        :param cutoff: Threshold for min number of DelVGs in each dataset
+
+        :return: Pandas DataFrame with reordered categories of "dataset"
+    '''
+    order = list()
+    for selection in CULTIVATION_TYPES:
+        order.extend(get_dataset_names(cutoff=cutoff, selection=selection))
+    categories = df["dataset"].cat.categories
+    order = [n for n in order if n in categories] + [n for n in categories if n not in order]
+    return df.assign(dataset=df["dataset"].cat.reorder_categories(order))
+
 def sort_datasets_by_type(dfs: list, dfnames: list, cutoff: int)-> Tuple[list, list]:
     '''
         Sorts a given name of experiments by cultivation type.
@@ -815,34 +1196,79 @@ def sort_datasets_by_type(dfs: list, dfnames: list, cutoff: int)-> Tuple[list, l
 
     return dfs_sorted, dfnames_sorted
 
-def join_data(df: pd.DataFrame)-> pd.DataFrame:
+def join_data(df: pd.DataFrame, per_accession: bool=False)-> object:
     '''
-        Combine duplicate DelVGs and sum their NGS count.
+        Combine duplicate DelVGs and sum their NGS count. The DelVGs are
+        aggregated by hashing their packed keys (see pack_keys()), only the
+        unique keys get sorted. All numeric columns are summed up like in a
+        groupby().sum().
         :param df: Pandas DataFrame with DelVG data
-
-        :return: Pandas DataFrame without duplicate DelVGs
+        :param per_accession: if True the NGS counts per SRA accession number
+            are returned additionally, needs the "Accession" column
+
+        :return: Pandas DataFrame without duplicate DelVGs, sorted by Segment,
+            Start and End. If per_accession is True a Tuple
+                Pandas DataFrame without duplicate DelVGs
+                scipy sparse csr matrix with the NGS count of each DelVG
+                    (rows) in each SRA accession number (columns)
+                list with the SRA accession numbers of the columns
     '''
-    return df.groupby(["Segment", "Start", "End"]).sum(["NGS_read_count"]).reset_index()
+    seg_codes, seg_names = pd.factorize(df["Segment"], sort=True)
+    valid = seg_codes >= 0
+    keys = pack_keys(seg_codes[valid], df["Start"].to_numpy()[valid], df["End"].to_numpy()[valid])
+    group, unique_keys = pd.factorize(keys)
+    order = np.argsort(unique_keys)
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    group = rank[group]
+    n_groups = len(order)
+
+    codes, starts, ends = unpack_keys(unique_keys[order])
+    joined_df = pd.DataFrame({
+        "Segment": seg_names.take(codes),
+        "Start": starts.astype(df["Start"].dtype),
+        "End": ends.astype(df["End"].dtype)
+    })
+    for col in df.columns:
+        if col in ["Segment", "Start", "End"] or not pd.api.types.is_numeric_dtype(df[col]):
+            continue
+        values = df[col].to_numpy()[valid]
+        if values.dtype.kind == "f":
+            joined_df[col] = np.bincount(group, weights=np.nan_to_num(values), minlength=n_groups)
+        else:
+            joined_df[col] = np.bincount(group, weights=values, minlength=n_groups).astype(np.int64)
+
+    if not per_accession:
+        return joined_df
+
+    acc_codes, accessions = pd.factorize(df["Accession"].to_numpy()[valid])
+    counts = sparse.coo_matrix((df["NGS_read_count"].to_numpy()[valid], (group, acc_codes)),
+                               shape=(n_groups, len(accessions))).tocsr()
+    return joined_df, counts, list(accessions)
 
 def load_mapped_reads(experiment: str)-> pd.DataFrame:
     '''
-        Loads data about the reads that were mapped to each segment.
+        Loads data about the reads that were mapped to each segment. Is read
+        from the container of the experiment if it exists.
         :param experiment: name of the experiment (is also folder name)
 
         :return: Pandas DataFrame with mapped reads per segment
     '''
-    acc_nums = ACCNUMDICT[experiment]
+    concat_df = read_dataset_container(experiment, "mapped_reads")
+    if concat_df is not None:
+        return concat_df
 
+    acc_nums = ACCNUMDICT[experiment]
     dfs = list()
     for acc_num, meta in acc_nums.items():
-        path = os.path.join(DATAPATH, experiment, f"{acc_num}_mapped_reads_per_segment.csv")
-        if not os.path.exists(path):
-            path = os.path.join(DATAPATH, experiment, f"{acc_num}both_mapped_reads_per_segment.csv")
-        df = pd.read_csv(path, dtype={"counts":"int64","segment": "string"}, na_values=["", "None"], keep_default_na=False)
+        df = read_mapped_reads_csv(experiment, acc_num)
+        df["Accession"] = acc_num
         for m in meta.keys():
             df[m] = meta[m]
         dfs.append(df)
-    concat_df = pd.concat(dfs)
+    concat_df = pd.concat(dfs, ignore_index=True)
+    for col in ["Accession"] + get_metadata_keys(experiment):
+        concat_df[col] = concat_df[col].astype("category")
 
     return concat_df
 
@@ -860,6 +1286,183 @@ def load_all_mapped_reads(dfnames: list)-> list:
         mr_dfs.append(df)
     return mr_dfs
 
+###########################
+### REFERENCE SEQUENCES ###
+###########################
+# registry of the already parsed reference sequences, (strain, seg) as key
+REFERENCE_REGISTRY = dict()
+# memory mapped archive of all reference sequences, see build_genome_archive()
+GENOME_ARCHIVE = None
+# the archive is only looked up once per process, see open_genome_archive()
+GENOME_ARCHIVE_CHECKED = False
+GENOME_ARCHIVE_MAGIC = b"DIPGENOME1"
+
+def get_fasta_path(strain: str, seg: str)-> str:
+    '''
+        Gives the path to the reference fasta file of a strain and segment.
+        :param strain: name of the strain
+        :param seg: name of the segment
+
+        :return: path to the fasta file
+    '''
+    return os.path.join(DATAPATH, "strain_segment_fastas", strain, f"{seg}.fasta")
+
+def invalidate_references(strain: str=None, seg: str=None)-> None:
+    '''
+        Removes reference sequences from the registry, so they are loaded
+        again from disk on the next access. The fasta files are only checked
+        once per process, so this needs to be called when a fasta file was
+        changed while the process is running.
+        :param strain: name of the strain, if None all strains are removed
+        :param seg: name of the segment, if None all segments are removed
+
+        :return: None
+    '''
+    for key in list(REFERENCE_REGISTRY.keys()):
+        if (strain is None or key[0] == strain) and (seg is None or key[1] == seg):
+            del REFERENCE_REGISTRY[key]
+
+def get_genome_archive_path()-> str:
+    '''
+        Gives the path to the packed genome archive of all reference
+        sequences.
+
+        :return: path to the archive file
+    '''
+    return os.path.join(DATAPATH, "strain_segment_fastas", "genome_archive.bin")
+
+def build_genome_archive(strains: list=None)-> str:
+    '''
+        Writes the transcribed reference sequences of all strains into one
+        binary archive. The file starts with GENOME_ARCHIVE_MAGIC, followed
+        by the length of the index (8 bytes, little endian), the index as JSON
+        and the sequences as uint8 ASCII codes. The index gives offset and
+        length for each "{strain}/{seg}" together with the modification time
+        and size of the fasta file it was created from.
+        :param strains: list of strains to include, if None all strains of
+            DATASET_STRAIN_DICT are used
+
+        :return: path to the written archive
+    '''
+    if strains is None:
+        strains = sorted(set(DATASET_STRAIN_DICT.values()))
+    index = dict()
+    payload = bytearray()
+    for strain in strains:
+        for seg in SEGMENTS:
+            fasta_file = get_fasta_path(strain, seg)
+            if not os.path.exists(fasta_file):
+                continue
+            stat = os.stat(fasta_file)
+            seq = str(SeqIO.read(fasta_file, "fasta").seq.transcribe())
+            index[f"{strain}/{seg}"] = dict({
+                "offset": len(payload),
+                "len": len(seq),
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size
+            })
+            payload.extend(seq.encode("ascii"))
+
+    header = json.dumps(index).encode("utf-8")
+    path = get_genome_archive_path()
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(GENOME_ARCHIVE_MAGIC)
+        f.write(len(header).to_bytes(8, "little"))
+        f.write(header)
+        f.write(payload)
+    os.replace(tmp_path, path)
+    open_genome_archive(reload=True)
+    return path
+
+def open_genome_archive(reload: bool=False)-> dict:
+    '''
+        Maps the genome archive into memory. All processes that open the
+        archive share the same copy in the page cache. The archive is only
+        looked up once per process, unless it is reloaded explicitly.
+        :param reload: if True the archive is looked up again, the registry
+            of the reference sequences is cleared if the archive changed
+
+        :return: dictionary with the index and a numpy uint8 view on the
+            sequences, None if no archive exists
+    '''
+    global GENOME_ARCHIVE, GENOME_ARCHIVE_CHECKED
+    if GENOME_ARCHIVE_CHECKED and not reload:
+        return GENOME_ARCHIVE
+    GENOME_ARCHIVE_CHECKED = True
+    path = get_genome_archive_path()
+    if not os.path.exists(path):
+        GENOME_ARCHIVE = None
+        invalidate_references()
+        return None
+    stat = os.stat(path)
+    signature = (path, stat.st_mtime_ns, stat.st_size)
+    if GENOME_ARCHIVE is not None and GENOME_ARCHIVE["signature"] == signature:
+        return GENOME_ARCHIVE
+
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mm[:len(GENOME_ARCHIVE_MAGIC)] != GENOME_ARCHIVE_MAGIC:
+        raise ValueError(f"{path} is not a genome archive")
+    pos = len(GENOME_ARCHIVE_MAGIC)
+    header_len = int.from_bytes(mm[pos:pos+8], "little")
+    pos += 8
+    index = json.loads(mm[pos:pos+header_len].decode("utf-8"))
+    GENOME_ARCHIVE = dict({
+        "signature": signature,
+        "index": index,
+        "data": np.frombuffer(mm, dtype=np.uint8, offset=pos+header_len)
+    })
+    # invalidate sequences that were served from an older archive
+    invalidate_references()
+    return GENOME_ARCHIVE
+
+def load_reference(strain: str, seg: str)-> dict:
+    '''
+        Loads a reference sequence into the registry. If the genome archive
+        holds an up to date copy of the sequence it is read from there,
+        otherwise the fasta file is parsed. Each sequence is only loaded and
+        checked against its fasta file once per process, see
+        invalidate_references() to load it again.
+        :param strain: name of the strain
+        :param seg: name of the segment
+
+        :return: dictionary with the transcribed sequence ("seq"), its length
+            ("len"), a read-only numpy uint8 view of the transcribed sequence
+            ("array") and the Biopython SeqRecord ("record"), that is only
+            parsed when it is requested by get_sequence()
+    '''
+    entry = REFERENCE_REGISTRY.get((strain, seg))
+    if entry is not None:
+        return entry
+
+    fasta_file = get_fasta_path(strain, seg)
+    if os.path.exists(fasta_file):
+        stat = os.stat(fasta_file)
+        signature = (stat.st_mtime_ns, stat.st_size)
+    else:
+        signature = None
+    archive = open_genome_archive()
+    record = None
+    archived = archive["index"].get(f"{strain}/{seg}") if archive is not None else None
+    if archived is not None and signature in [None, (archived["mtime_ns"], archived["size"])]:
+        arr = archive["data"][archived["offset"]:archived["offset"]+archived["len"]]
+        seq = arr.tobytes().decode("ascii")
+    else:
+        record = SeqIO.read(fasta_file, "fasta")
+        seq = str(record.seq.transcribe())
+        arr = np.frombuffer(seq.encode("ascii"), dtype=np.uint8)
+
+    entry = dict({
+        "signature": signature,
+        "seq": seq,
+        "len": len(seq),
+        "array": arr,
+        "record": record
+    })
+    REFERENCE_REGISTRY[(strain, seg)] = entry
+    return entry
+
 def get_sequence(strain: str, seg: str, full: bool=False)-> object:
     '''
         Loads a DNA sequence given the strain and segment.
@@ -870,12 +1473,24 @@ def get_sequence(strain: str, seg: str, full: bool=False)-> object:
 
         :return: Biopython Seq Object or str() of the sequence
     '''
-    fasta_file = os.path.join(DATAPATH, "strain_segment_fastas", strain, f"{seg}.fasta")
-    seq_obj = SeqIO.read(fasta_file, "fasta")
+    entry = load_reference(strain, seg)
     if full:
-        return seq_obj
+        if entry["record"] is None:
+            entry["record"] = SeqIO.read(get_fasta_path(strain, seg), "fasta")
+        return entry["record"]
     else:
-        return str(seq_obj.seq.transcribe())
+        return entry["seq"]
+
+def get_sequence_array(strain: str, seg: str)-> np.ndarray:
+    '''
+        Loads a RNA sequence given the strain and segment as numpy array.
+        :param strain: name of the strain
+        :param seg: name of the segment
+
+        :return: read-only numpy uint8 array with the ASCII codes of the
+            sequence
+    '''
+    return load_reference(strain, seg)["array"]
 
 def get_seq_len(strain: str, seg: str)-> int:
     '''
@@ -886,8 +1501,228 @@ def get_seq_len(strain: str, seg: str)-> int:
 
         :return: length of the sequence as int
     '''
-    return len(get_sequence(strain, seg))
+    return load_reference(strain, seg)["len"]
+
+##################
+### DelVG KEYS ###
+##################
+def pack_keys(codes: np.ndarray, starts: np.ndarray, ends: np.ndarray)-> np.ndarray:
+    '''
+        Packs segment codes, start and end positions into one int64 key. The
+        segment code is stored in the bits above KEY_SEGMENT_SHIFT, start and
+        end get KEY_POSITION_BITS bits each.
+        :param codes: integer codes of the segments
+        :param starts: start positions of the deletion sites
+        :param ends: end positions of the deletion sites
+
+        :return: numpy int64 array with one key per DelVG
+    '''
+    codes = np.asarray(codes, dtype=np.int64)
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    max_pos = 1 << KEY_POSITION_BITS
+    if ((starts < 0) | (starts >= max_pos) | (ends < 0) | (ends >= max_pos)).any():
+        raise ValueError(f"Positions need to be in the range of 0 to {max_pos-1}")
+    return (codes << KEY_SEGMENT_SHIFT) | (starts << KEY_POSITION_BITS) | ends
+
+def unpack_keys(keys: np.ndarray)-> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    '''
+        Unpacks keys created by pack_keys().
+        :param keys: int64 keys of the DelVGs
+
+        :return: Tuple
+            numpy array with the segment codes
+            numpy array with the start positions
+            numpy array with the end positions
+    '''
+    keys = np.asarray(keys, dtype=np.int64)
+    mask = (1 << KEY_POSITION_BITS) - 1
+    return keys >> KEY_SEGMENT_SHIFT, (keys >> KEY_POSITION_BITS) & mask, keys & mask
+
+def encode_keys(segments: object, starts: object, ends: object, categories: list=SEGMENTS)-> np.ndarray:
+    '''
+        Packs segment, start and end of DelVGs into one int64 key, see
+        pack_keys().
+        :param segments: segment names of the DelVGs
+        :param starts: start positions of the deletion sites
+        :param ends: end positions of the deletion sites
+        :param categories: list of all possible segment names, the index in
+            this list is used as segment code
+
+        :return: numpy int64 array with one key per DelVG
+    '''
+    codes = pd.Categorical(np.asarray(segments, dtype=object), categories=categories).codes
+    if (codes == -1).any():
+        raise ValueError(f"Unknown segment names: {set(np.asarray(segments, dtype=object)[codes == -1])}")
+    return pack_keys(codes, starts, ends)
+
+def decode_keys(keys: object, categories: list=SEGMENTS)-> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    '''
+        Unpacks keys created by encode_keys().
+        :param keys: int64 keys of the DelVGs
+        :param categories: list of all possible segment names, as used for
+            creating the keys
+
+        :return: Tuple
+            numpy array with the segment names
+            numpy array with the start positions
+            numpy array with the end positions
+    '''
+    codes, starts, ends = unpack_keys(keys)
+    return np.asarray(categories, dtype=object)[codes], starts, ends
+
+def keys_to_str(keys: object, categories: list=SEGMENTS)-> np.ndarray:
+    '''
+        Converts keys created by encode_keys() to the string nomenclature
+        {seg}_{start}_{end}. Should only be used for exporting the data.
+        :param keys: int64 keys of the DelVGs
+        :param categories: list of all possible segment names, as used for
+            creating the keys
+
+        :return: numpy array with the string keys
+    '''
+    segments, starts, ends = decode_keys(keys, categories)
+    return np.array([f"{seg}_{s}_{e}" for seg, s, e in zip(segments, starts, ends)], dtype=object)
+
+def str_to_keys(str_keys: object, categories: list=SEGMENTS)-> np.ndarray:
+    '''
+        Converts string keys with the nomenclature {seg}_{start}_{end} into
+        keys as created by encode_keys().
+        :param str_keys: string keys of the DelVGs
+        :param categories: list of all possible segment names
+
+        :return: numpy int64 array with one key per DelVG
+    '''
+    parts = pd.Series(str_keys, dtype=object).str.split("_", expand=True)
+    return encode_keys(parts[0], parts[1].astype("int64"), parts[2].astype("int64"), categories)
+
+#######################
+### DATASET OVERLAP ###
+#######################
+def _build_key_matrix(dataset_keys: list, values: list=None)-> Tuple[np.ndarray, sparse.csc_matrix]:
+    '''
+        Builds a sparse DelVGs x datasets matrix from the sorted unique keys
+        of each dataset.
+        :param dataset_keys: list with the sorted unique keys of each dataset
+        :param values: list with one value per key for each dataset, if None
+            the matrix holds 1 for each occurrence
+
+        :return: Tuple
+            sorted unique keys of all datasets, index of the rows
+            sparse matrix (DelVGs x datasets)
+    '''
+    keys, rows = np.unique(np.concatenate(dataset_keys), return_inverse=True)
+    # the keys of each dataset are unique and sorted, so they are already
+    # the row indices of one column in csc format
+    indptr = np.concatenate(([0], np.cumsum([k.size for k in dataset_keys])))
+    data = np.ones(rows.size, dtype=np.int32) if values is None else np.concatenate(values)
+    return keys, sparse.csc_matrix((data, rows, indptr), shape=(keys.size, len(dataset_keys)))
+
+def build_membership_matrix(dfs: list, col: str="key")-> Tuple[np.ndarray, sparse.csc_matrix]:
+    '''
+        Builds a sparse matrix that indicates in which datasets each DelVG
+        occurs. Rows are the unique DelVGs of all datasets, columns are the
+        datasets. DelVGs that occur multiple times in one dataset are counted
+        once.
+        :param dfs: The list of DataFrames containing the data, preprocessed
+            with sequence_df(df)
+        :param col: column that holds the keys of the DelVGs
+
+        :return: Tuple
+            sorted unique keys of all datasets, index of the rows
+            sparse int32 matrix (DelVGs x datasets) with 1 for each occurrence
+    '''
+    return _build_key_matrix([np.unique(df[col].to_numpy()) for df in dfs])
+
+def calc_percentile_ranks(counts: np.ndarray)-> np.ndarray:
+    '''
+        Calculates the percentile rank of each value within its own sample.
+        Gives the same result as stats.percentileofscore(counts, c) for each
+        c in counts, but sorts the sample only once.
+        :param counts: values of the sample, e.g. the NGS counts of a dataset
+
+        :return: numpy array with the percentile rank of each value
+    '''
+    counts = np.asarray(counts)
+    sorted_counts = counts[np.argsort(counts, kind="stable")]
+    left = np.searchsorted(sorted_counts, counts, side="left")
+    right = np.searchsorted(sorted_counts, counts, side="right")
+    return (left + right + (left < right)) * (50.0 / counts.size)
+
+def build_delvg_index(dfs: list, col: str="key", count_col: str="NGS_read_count")-> Tuple[np.ndarray, sparse.csr_matrix, sparse.csr_matrix]:
+    '''
+        Builds an inverted index that maps each DelVG to its NGS count and its
+        percentile rank in every dataset. The ranks are calculated once per
+        dataset. If a DelVG occurs multiple times in one dataset the first
+        entry is used.
+        :param dfs: The list of DataFrames containing the data, preprocessed
+            with sequence_df(df)
+        :param col: column that holds the keys of the DelVGs
+        :param count_col: column that holds the counts of the DelVGs
+
+        :return: Tuple
+            sorted unique keys of all datasets, index of the rows
+            sparse matrix (DelVGs x datasets) with the counts
+            sparse matrix (DelVGs x datasets) with the percentile ranks, 0 if
+                the DelVG is not in the dataset
+    '''
+    dataset_keys = list()
+    counts = list()
+    ranks = list()
+    for df in dfs:
+        k, first = np.unique(df[col].to_numpy(), return_index=True)
+        c = df[count_col].to_numpy()
+        dataset_keys.append(k)
+        counts.append(c[first].astype(float))
+        ranks.append(calc_percentile_ranks(c)[first])
+
+    keys, count_matrix = _build_key_matrix(dataset_keys, counts)
+    _, rank_matrix = _build_key_matrix(dataset_keys, ranks)
+    return keys, count_matrix.tocsr(), rank_matrix.tocsr()
+
+def lookup_delvg_index(query: object, keys: np.ndarray, matrix: sparse.csr_matrix)-> np.ndarray:
+    '''
+        Looks up the rows of an index created by build_delvg_index().
+        :param query: keys of the DelVGs to look up
+        :param keys: keys of the index
+        :param matrix: count or rank matrix of the index
+
+        :return: numpy array (query x datasets), 0 for DelVGs that are not in
+            the index
+    '''
+    query = np.asarray(query)
+    pos = np.minimum(np.searchsorted(keys, query), max(keys.size - 1, 0))
+    found = keys[pos] == query if keys.size > 0 else np.zeros(query.size, dtype=bool)
+    result = np.zeros((query.size, matrix.shape[1]))
+    result[found] = matrix[pos[found]].toarray()
+    return result
+
+def calc_overlap_matrix(membership: sparse.csc_matrix)-> np.ndarray:
+    '''
+        Calculates the number of shared DelVGs for all pairs of datasets with
+        one sparse matrix product.
+        :param membership: membership matrix created by
+            build_membership_matrix()
+
+        :return: numpy array (datasets x datasets) with the number of
+            intersecting DelVGs, the diagonal holds the number of unique
+            DelVGs of each dataset
+    '''
+    return (membership.T @ membership).toarray().astype(np.int64)
+
+def count_datasets_per_key(membership: sparse.csc_matrix)-> np.ndarray:
+    '''
+        Counts in how many datasets each DelVG occurs.
+        :param membership: membership matrix created by
+            build_membership_matrix()
 
+        :return: numpy array with the number of datasets for each row
+    '''
+    return np.asarray(membership.sum(axis=1)).ravel()
+
+##################
+### STATISTICS ###
+##################
 def get_p_value_symbol(p: float)-> str:
     '''
         Indicates the statistical significance by strings. Is used for plots.
@@ -904,21 +1739,219 @@ def get_p_value_symbol(p: float)-> str:
     else:
         return "ns."
 
-def calc_cliffs_d(d1: list, d2: list)-> float:
+def frequency_table(d)-> Tuple[np.ndarray, np.ndarray]:
+    '''
+        Converts a sample into a frequency table of its unique values.
+        :param d: sample given as a list of observations or as a tuple of
+            (values, weights), where weights holds how often each value was
+            observed; values can occur multiple times
+        
+        :return: Tuple with the sorted unique values and their summed weights
+    '''
+    if isinstance(d, tuple) and len(d) == 2 and np.ndim(d[0]) == 1:
+        values, inverse = np.unique(np.asarray(d[0]), return_inverse=True)
+        weights = np.bincount(inverse, weights=np.asarray(d[1], dtype=float), minlength=len(values))
+    else:
+        values, weights = np.unique(np.asarray(d), return_counts=True)
+    return values, weights.astype(float)
+
+def calc_weighted_median(values, weights)-> float:
+    '''
+        Calculates the median of a sample given as frequency table without
+        expanding it. Gives the same result as np.median on the expanded
+        sample.
+        :param values: observed values
+        :param weights: number of observations of each value
+        
+        :return: median of the sample
+    '''
+    values, weights = frequency_table((values, weights))
+    n = weights.sum()
+    cum = np.cumsum(weights)
+    lower = values[np.searchsorted(cum, (n - 1) // 2, side="right")]
+    upper = values[np.searchsorted(cum, n // 2, side="right")]
+    return (lower + upper) / 2
+
+def calc_cliffs_d(d1, d2)-> float:
     '''
         Cliff, Norman (1993). Dominance statistics: Ordinal analyses to answer
         ordinal questions (eq. 3)
         Cliffs d ranges from -1 (max effect of group 2) to 0 (no effect) to
         1 (max effect of group 1) Meissel K. and Yao E. (2024)
-        :param d1: dataset 1
-        :param d2: dataset 2
+        The Mann-Whitney U of group 1 is calculated on the frequency tables of
+        the unique values, ties are counted half. This equals U of
+        stats.mannwhitneyu on the expanded samples.
+        :param d1: dataset 1, list of observations or (values, weights)
+        :param d2: dataset 2, list of observations or (values, weights)
+
+        :return: cliff's d
+    '''
+    return cliffs_d_from_tables(ranked_table(d1), ranked_table(d2))
+
+def ranked_table(d)-> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    '''
+        Prepares a sample for repeated calculations of Cliff's d, so it only
+        needs to be sorted once.
+        :param d: list of observations or (values, weights)
+
+        :return: Tuple with the sorted unique values, their weights and the
+            cumulative weights starting with 0
+    '''
+    values, weights = frequency_table(d)
+    return values, weights, np.concatenate(([0.0], np.cumsum(weights)))
+
+def cliffs_d_from_tables(t1: tuple, t2: tuple)-> float:
+    '''
+        Calculates Cliff's d of two samples prepared by ranked_table().
+        :param t1: ranked table of dataset 1
+        :param t2: ranked table of dataset 2
 
         :return: cliff's d
     '''
-    U, _ = stats.mannwhitneyu(d1, d2)
-    cliffs_d = 2*U / (len(d1)*len(d2)) - 1
+    v1, w1, cum1 = t1
+    v2, _, cum2 = t2
+    lower = cum2[np.searchsorted(v2, v1, side="left")]
+    upper = cum2[np.searchsorted(v2, v1, side="right")]
+    U = np.dot(w1, lower + 0.5 * (upper - lower))
+    cliffs_d = 2*U / (cum1[-1]*cum2[-1]) - 1
     return cliffs_d
 
+def calc_cliffs_d_pair(tables: tuple)-> float:
+    '''
+        Calculates Cliff's d of a pair of ranked tables. Is mapped over all
+        pairs by calc_cliffs_d_matrix().
+        :param tables: tuple with the ranked tables of dataset 1 and 2, see
+            ranked_table()
+
+        :return: cliff's d
+    '''
+    return cliffs_d_from_tables(*tables)
+
+def calc_cliffs_d_matrix(samples: list, names: list=None, workers: int=1)-> pd.DataFrame:
+    '''
+        Calculates Cliff's d between all pairs of samples. Each sample is
+        ranked once and only the upper triangle is calculated, the lower
+        triangle is mirrored with flipped sign, as d(b, a) = -d(a, b).
+        :param samples: list of samples, each a list of observations or
+            (values, weights)
+        :param names: names of the samples, used as index and columns
+        :param workers: number of processes used to calculate the pairs, only
+            worth it for many large samples
+
+        :return: DataFrame with cliff's d of row sample against column sample,
+            the diagonal is NaN
+    '''
+    tables = [ranked_table(d) for d in samples]
+    n = len(tables)
+    rows, cols = np.triu_indices(n, k=1)
+    pairs = [(tables[i], tables[j]) for i, j in zip(rows, cols)]
+    n_processes = min(workers, len(pairs))
+    if n_processes > 1:
+        with ProcessPoolExecutor(max_workers=n_processes) as executor:
+            upper = list(executor.map(calc_cliffs_d_pair, pairs, chunksize=max(len(pairs) // (4 * n_processes), 1)))
+    else:
+        upper = [calc_cliffs_d_pair(p) for p in pairs]
+
+    matrix = np.full((n, n), np.nan)
+    matrix[rows, cols] = upper
+    matrix[cols, rows] = -matrix[rows, cols]
+    names = list(range(n)) if names is None else list(names)
+    return pd.DataFrame(matrix, index=names, columns=names)
+
+def two_proportion_test(k1: np.ndarray, n1: np.ndarray, k2: np.ndarray, n2: np.ndarray,
+                        method: str="anova", correction: str=None)-> np.ndarray:
+    '''
+        Tests if two proportions differ, for many pairs at once. The
+        proportions are given as number of successes in a number of trials.
+        :param k1: number of successes in group 1
+        :param n1: number of trials in group 1
+        :param k2: number of successes in group 2
+        :param n2: number of trials in group 2
+        :param method: "anova" for a one-way ANOVA on the binary data, gives
+            the same p-values as stats.f_oneway() on arrays of ones and
+            zeros, "ztest" for a pooled two-proportion z-test
+        :param correction: None, "bonferroni" or "fdr_bh" to correct the
+            p-values for multiple testing, see correct_p_values()
+
+        :return: numpy array with the p-values, same shape as the input
+    '''
+    k1, n1, k2, n2 = (np.asarray(a, dtype=np.float64) for a in (k1, n1, k2, n2))
+    n = n1 + n2
+    pooled = (k1 + k2) / n
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if method == "anova":
+            # sum of squares between and within the groups of binary values
+            ss_between = k1**2 / n1 + k2**2 / n2 - (k1 + k2)**2 / n
+            ss_within = k1 - k1**2 / n1 + k2 - k2**2 / n2
+            f = ss_between / (ss_within / (n - 2))
+            # identical values within each group, like stats.f_oneway()
+            f = np.where(np.isclose(ss_within, 0), np.where(np.isclose(ss_between, 0), np.nan, np.inf), f)
+            p_values = stats.f.sf(f, 1, n - 2)
+        elif method == "ztest":
+            se = np.sqrt(pooled * (1 - pooled) * (1 / n1 + 1 / n2))
+            z = (k1 / n1 - k2 / n2) / se
+            p_values = 2 * stats.norm.sf(np.abs(z))
+        else:
+            raise ValueError(f"Unknown test method: {method}")
+
+    if correction is not None:
+        p_values = correct_p_values(p_values, correction)
+    return p_values
+
+def one_proportion_test(k: np.ndarray, n: np.ndarray, p0: np.ndarray, correction: str=None)-> np.ndarray:
+    '''
+        Tests if proportions differ from known probabilities, for many
+        proportions at once. Is a chi-square goodness-of-fit test with one
+        degree of freedom, used when the expected values are exact
+        probabilities and not a sample.
+        :param k: number of successes
+        :param n: number of trials
+        :param p0: expected probability of a success
+        :param correction: None, "bonferroni" or "fdr_bh" to correct the
+            p-values for multiple testing, see correct_p_values()
+
+        :return: numpy array with the p-values, same shape as the input
+    '''
+    k, n, p0 = (np.asarray(a, dtype=np.float64) for a in (k, n, p0))
+    expected = n * p0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        chi2 = (k - expected)**2 / (expected * (1 - p0))
+    # for probabilities of 0 or 1 any deviation is impossible under the null
+    chi2 = np.where(np.isclose(expected * (1 - p0), 0), np.where(np.isclose(k, expected), np.nan, np.inf), chi2)
+    p_values = stats.chi2.sf(chi2, 1)
+
+    if correction is not None:
+        p_values = correct_p_values(p_values, correction)
+    return p_values
+
+def correct_p_values(p_values: np.ndarray, method: str)-> np.ndarray:
+    '''
+        Corrects p-values for multiple testing. NaN values are ignored.
+        :param p_values: numpy array with the p-values
+        :param method: "bonferroni" or "fdr_bh" (Benjamini-Hochberg)
+
+        :return: numpy array with the corrected p-values, same shape as the
+            input
+    '''
+    p_values = np.asarray(p_values, dtype=np.float64)
+    corrected = np.full(p_values.shape, np.nan)
+    valid = ~np.isnan(p_values)
+    p = p_values[valid]
+    m = len(p)
+    if method == "bonferroni":
+        corrected[valid] = np.minimum(p * m, 1)
+    elif method == "fdr_bh":
+        order = np.argsort(p)
+        scaled = p[order] * m / np.arange(1, m+1)
+        # enforce monotonicity from the largest p-value downwards
+        scaled = np.minimum.accumulate(scaled[::-1])[::-1]
+        adjusted = np.empty(m)
+        adjusted[order] = np.minimum(scaled, 1)
+        corrected[valid] = adjusted
+    else:
+        raise ValueError(f"Unknown correction method: {method}")
+    return corrected
+
 ######################
 ### DIRECT REPEATS ###
 ######################
@@ -959,6 +1992,111 @@ def calculate_direct_repeat(seq: str, s: int, e: int, w_len: int)-> Tuple[int, s
 
     return counter, overlap_seq
 
+def calc_direct_repeat_lengths(starts: np.ndarray, ends: np.ndarray, seq_arr: np.ndarray, w_len: int=5)-> Tuple[np.ndarray, np.ndarray]:
+    '''
+        Calculates the direct repeat length of multiple DelVGs of the same
+        segment at once, like calculate_direct_repeat().
+        :param starts: start positions of the deletion sites
+        :param ends: end positions of the deletion sites
+        :param seq_arr: numpy uint8 array with the ASCII codes of the RNA
+            sequence (see get_sequence_array())
+        :param w_len: length of window to be searched
+
+        :return: Tuple
+            numpy array with the direct repeat length of each DelVG
+            numpy bool array, False for DelVGs at the borders of the sequence
+                that were calculated by calculate_direct_repeat()
+    '''
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    seq_arr = np.asarray(seq_arr, dtype=np.uint8)
+    lengths = np.empty(len(starts), dtype=np.int64)
+
+    # both windows have full length and the end lies inside the sequence
+    regular = (starts >= w_len) & (starts <= len(seq_arr)) & (ends - 1 - w_len >= 0) & (ends <= len(seq_arr))
+    rows = np.flatnonzero(regular)
+    if len(rows) > 0:
+        offsets = np.arange(-w_len, 0)
+        start_windows = seq_arr[starts[rows, None] + offsets]
+        end_windows = seq_arr[ends[rows, None] - 1 + offsets]
+        # length of the common suffix of both windows
+        mismatch = start_windows != end_windows
+        last_mismatch = np.where(mismatch.any(axis=1), w_len - 1 - np.argmax(mismatch[:, ::-1], axis=1), -1)
+        lengths[rows] = w_len - 1 - last_mismatch
+
+    # at the borders of the sequence fall back to the string implementation
+    irregular = np.flatnonzero(~regular)
+    if len(irregular) > 0:
+        seq = seq_arr.tobytes().decode("ascii")
+        for i in irregular:
+            lengths[i], _ = calculate_direct_repeat(seq, starts[i], ends[i], w_len)
+
+    return lengths, regular
+
+def count_direct_repeats(starts: np.ndarray, ends: np.ndarray, seq_arr: np.ndarray, w_len: int=5, weights: np.ndarray=None)-> Tuple[np.ndarray, dict]:
+    '''
+        Calculates the direct repeats of multiple DelVGs of the same segment
+        at once. Gives the same results as calling calculate_direct_repeat()
+        for each DelVG.
+        :param starts: start positions of the deletion sites
+        :param ends: end positions of the deletion sites
+        :param seq_arr: numpy uint8 array with the ASCII codes of the RNA
+            sequence (see get_sequence_array())
+        :param w_len: length of window to be searched
+        :param weights: weight of each DelVG, if None each DelVG is counted
+            once
+
+        :return: Tuple
+            numpy array with the count of each direct repeat length
+            Dict with the overlapping sequences and their count, in the order
+                of their first occurrence
+    '''
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    seq_arr = np.asarray(seq_arr, dtype=np.uint8)
+    if weights is None:
+        weights = np.ones(len(starts), dtype=np.int64)
+    weights = np.asarray(weights)
+    first_rows = dict()
+    overlap_counts = dict()
+
+    lengths, regular = calc_direct_repeat_lengths(starts, ends, seq_arr, w_len)
+    counts = np.bincount(lengths, weights=weights, minlength=w_len+1).astype(weights.dtype)
+
+    rows = np.flatnonzero(regular)
+    if len(rows) > 0:
+        # identify the overlapping sequences by their length and nucleotides,
+        # the overlap is the end of the window before the start
+        start_windows = seq_arr[starts[rows, None] + np.arange(-w_len, 0)]
+        row_lengths = lengths[rows]
+        masked = np.where(np.arange(w_len) >= w_len - row_lengths[:, None], start_windows, 0).astype(np.uint64)
+        seq_keys = masked @ (np.uint64(256) ** np.arange(w_len, dtype=np.uint64)) + row_lengths.astype(np.uint64) * np.uint64(256) ** np.uint64(w_len)
+        codes, _ = pd.factorize(seq_keys)
+        n_codes = codes.max() + 1
+        first = np.full(n_codes, len(rows), dtype=np.int64)
+        np.minimum.at(first, codes, np.arange(len(rows)))
+        code_counts = np.bincount(codes, weights=weights[rows], minlength=n_codes).astype(weights.dtype)
+        for i, n in zip(first, code_counts):
+            l = row_lengths[i]
+            overlap_seq = start_windows[i, w_len-l:].tobytes().decode("ascii") if l > 0 else "_"
+            first_rows[overlap_seq] = rows[i]
+            overlap_counts[overlap_seq] = n.item()
+
+    irregular = np.flatnonzero(~regular)
+    if len(irregular) > 0:
+        seq = seq_arr.tobytes().decode("ascii")
+        for i in irregular:
+            _, overlap_seq = calculate_direct_repeat(seq, starts[i], ends[i], w_len)
+            if overlap_seq in overlap_counts:
+                overlap_counts[overlap_seq] += weights[i].item()
+                first_rows[overlap_seq] = min(first_rows[overlap_seq], i)
+            else:
+                overlap_counts[overlap_seq] = weights[i].item()
+                first_rows[overlap_seq] = i
+
+    overlap_seq_dict = dict({k: overlap_counts[k] for k in sorted(overlap_counts, key=first_rows.get)})
+    return counts, overlap_seq_dict
+
 def count_direct_repeats_overall(df: pd.DataFrame, seq: str)-> Tuple[dict, dict]:
     '''
         Calculates the number of direct repeats for each data point.
@@ -970,18 +2108,9 @@ def count_direct_repeats_overall(df: pd.DataFrame, seq: str)-> Tuple[dict, dict]
             Dict with the overlapping sequences and their count
     '''
     w_len = 5
-    nuc_overlap_dict = dict({i: 0 for i in range(0, w_len+1)})
-    overlap_seq_dict = dict()
- 
-    for _, row in df.iterrows():
-        s = row["Start"]
-        e = row["End"]
-        idx, overlap_seq = calculate_direct_repeat(seq, s, e, w_len)
-        nuc_overlap_dict[idx] += 1
-        if overlap_seq in overlap_seq_dict:
-            overlap_seq_dict[overlap_seq] += 1
-        else:
-            overlap_seq_dict[overlap_seq] = 1
+    seq_arr = np.frombuffer(seq.encode("ascii"), dtype=np.uint8)
+    counts, overlap_seq_dict = count_direct_repeats(df["Start"].to_numpy(), df["End"].to_numpy(), seq_arr, w_len)
+    nuc_overlap_dict = dict({i: int(counts[i]) for i in range(0, w_len+1)})
 
     return nuc_overlap_dict, overlap_seq_dict
 
@@ -1034,43 +2163,390 @@ def count_nucleotide_occurrence_overall(df: pd.DataFrame, seq: str)-> Tuple[dict
 #####################
 ### expected data ###
 #####################
-def generate_expected_data(strain: str, df: pd.DataFrame)-> pd.DataFrame:
+def get_sampling_window(df_s: pd.DataFrame, seq_len: int)-> Tuple[Tuple[int, int], Tuple[int, int]]:
+    '''
+        Defines the ranges around the mean start and end of the DelVGs of one
+        segment in which the deletion sites are sampled.
+        :param df_s: DelVG dataset of a single segment
+        :param seq_len: length of the segment
+
+        :return: Tuple with a tuple for the range of the start and one for
+            the range of the end points. None if no sampling is possible
+    '''
+    start = int(df_s["Start"].mean())
+    end = int(df_s["End"].mean())
+    s = (max(start-200, 50), start+200)
+    e = (end-200, min(end+200, seq_len-50))
+
+    # skip if there is no range given this would lead to oversampling of a single position
+    if s[0] == s[1] or e[0] == e[1]:
+        return None
+    # positions are overlapping
+    if s[1] > e[0]:
+        return None
+    return s, e
+
+def get_expected_cache_path(dfname: str, strain: str, df: pd.DataFrame, seed: int=SEED, adaptive: bool=False)-> str:
+    '''
+        Gives the path of the cached expected data of a dataset. The file name
+        includes a hash of all parameters of generate_expected_data(), the
+        sampling windows and the reference sequences. If one of them changes
+        the expected data is generated again.
+        :param dfname: name of the dataset
+        :param strain: name of the strain
+        :param df: DelVG dataset the expected data is generated for
+        :param seed: seed used for the random sampling
+        :param adaptive: if True the sample size is chosen by
+            generate_sampling_data_adaptive()
+
+        :return: path to the .npz file
+    '''
+    params = dict({
+        "version": EXPECTED_CACHE_VERSION,
+        "n_samples": N_SAMPLES,
+        "seed": seed,
+        "windows": dict(),
+        "references": dict()
+    })
+    if adaptive:
+        params["adaptive"] = [ADAPTIVE_BATCH_SIZE, ADAPTIVE_TOLERANCE, ADAPTIVE_MAX_SAMPLES]
+    for seg in SEGMENTS:
+        df_s = df.loc[df["Segment"] == seg]
+        if len(df_s) == 0:
+            continue
+        seq = get_sequence(strain, seg)
+        params["windows"][seg] = get_sampling_window(df_s, len(seq))
+        params["references"][seg] = hashlib.sha256(seq.encode("ascii")).hexdigest()
+    key = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+    return os.path.join(DATAPATH, "random_sampled", f"{dfname}_{key[:16]}.npz")
+
+def load_expected_data(dfname: str, strain: str, df: pd.DataFrame, seed: int=SEED, workers: int=1, adaptive: bool=False)-> pd.DataFrame:
+    '''
+        Loads the expected data of a dataset from the cache. If it does not
+        exist it is generated by generate_expected_data() and saved. Only
+        segment, start and end of the DelVGs are stored.
+        :param dfname: name of the dataset
+        :param strain: name of the strain
+        :param df: DelVG dataset the expected data is generated for
+        :param seed: seed used for the random sampling, is combined with the
+            dataset name so each dataset gets independent random numbers
+        :param workers: number of processes used to generate the data
+        :param adaptive: if True the sample size of each segment is chosen by
+            generate_sampling_data_adaptive()
+
+        :return: Pandas DataFrame with the expected DelVGs. With adaptive
+            sampling it has a column "weight" that weights all segments
+            equally, see get_segment_weights()
+    '''
+    path = get_expected_cache_path(dfname, strain, df, seed, adaptive)
+    if os.path.exists(path):
+        with np.load(path) as cache:
+            segments = np.array(SEGMENTS)[cache["Segment"]]
+            starts = cache["Start"]
+            ends = cache["End"]
+    else:
+        dataset_id = int(hashlib.sha256(dfname.encode()).hexdigest()[:8], 16)
+        samp_df = generate_expected_data(strain, df, None if seed is None else [seed, dataset_id], workers, adaptive)
+        segments = samp_df["Segment"].to_numpy()
+        starts = samp_df["Start"].to_numpy(dtype=np.int32)
+        ends = samp_df["End"].to_numpy(dtype=np.int32)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, Segment=pd.Categorical(segments, categories=SEGMENTS).codes,
+                 Start=starts, End=ends)
+        os.replace(tmp_path, path)
+
+    exp_df = pd.DataFrame(dict({
+        "Segment": segments,
+        "Start": starts.astype(np.int64),
+        "End": ends.astype(np.int64),
+        "NGS_read_count": 1
+    }))
+    if adaptive:
+        exp_df["weight"] = get_segment_weights(exp_df)
+    return exp_df
+
+def generate_expected_data(strain: str, df: pd.DataFrame, seed: object=SEED, workers: int=1, adaptive: bool=False)-> pd.DataFrame:
     '''
         Randomly samples deletion sites for a given dataset which can be used
-        to compare the results of the real dataset.
+        to compare the results of the real dataset. Each segment is sampled
+        with its own random state derived from the seed, so the result does
+        not depend on the number of workers.
         :param strain: name of the strain
         :param df: DelVG dataset
+        :param seed: seed used for the random sampling, int or list of ints
+        :param workers: number of processes used to sample the segments
+        :param adaptive: if True the number of samples of each segment is
+            chosen by generate_sampling_data_adaptive(), else N_SAMPLES are
+            drawn. The segments then differ in size, load_expected_data()
+            adds weights to count them equally
 
         :return: artifical dataset that includes random deletion sites
     '''
-    for seg in SEGMENTS:
+    seed_seqs = np.random.SeedSequence(seed).spawn(len(SEGMENTS))
+    tasks = list()
+    for seg, seed_seq in zip(SEGMENTS, seed_seqs):
         df_s = df.loc[df["Segment"] == seg]
         if len(df_s) == 0:
             continue
         seq = get_sequence(strain, seg)
-        start = int(df_s["Start"].mean())
-        end = int(df_s["End"].mean())
-        s = (max(start-200, 50), start+200)
-        e = (end-200, min(end+200, len(seq)-50))
-        
-        # skip if there is no range given this would lead to oversampling of a single position
-        if s[0] == s[1] or e[0] == e[1]:
-            continue
-        # positions are overlapping
-        if s[1] > e[0]:
+        window = get_sampling_window(df_s, len(seq))
+        if window is None:
             continue
-        if "samp_df" in locals():
-            temp_df = generate_sampling_data(seq, s, e, N_SAMPLES)
-            temp_df["Segment"] = seg
-            samp_df = pd.concat([samp_df, temp_df], ignore_index=True)
-        else:
-            samp_df = generate_sampling_data(seq, s, e, N_SAMPLES)
-            samp_df["Segment"] = seg
-    
+        s, e = window
+        random_state = np.random.RandomState(np.random.MT19937(seed_seq))
+        tasks.append((seg, seq, s, e, random_state))
+
+    if len(tasks) == 0:
+        # no segment has DelVGs or a valid sampling window
+        return pd.DataFrame(dict({
+            "index": pd.Series(dtype="int64"),
+            "Start": pd.Series(dtype="int64"),
+            "End": pd.Series(dtype="int64"),
+            "Segment": pd.Series(dtype=object),
+            "NGS_read_count": pd.Series(dtype="int64")
+        }))
+
+    segs, seqs, starts, ends, random_states = zip(*tasks)
+    if adaptive:
+        sampling_func = generate_sampling_data_adaptive
+        args = (seqs, starts, ends, random_states)
+    else:
+        sampling_func = generate_sampling_data
+        args = (seqs, starts, ends, [N_SAMPLES] * len(tasks), random_states)
+    n_processes = min(workers, len(tasks))
+    if n_processes > 1:
+        with ProcessPoolExecutor(max_workers=n_processes) as executor:
+            samp_dfs = list(executor.map(sampling_func, *args))
+    else:
+        samp_dfs = list(map(sampling_func, *args))
+
+    for seg, samp_df in zip(segs, samp_dfs):
+        samp_df["Segment"] = seg
+    samp_df = pd.concat(samp_dfs, ignore_index=True)
     samp_df["NGS_read_count"] = 1
     return samp_df.reset_index()
 
-def generate_sampling_data(seq: str, s: Tuple[int, int], e: Tuple[int, int],  n: int)-> pd.DataFrame:
+def generate_expected_distributions(strain: str, df: pd.DataFrame, isize: int=5)-> dict:
+    '''
+        Calculates the distributions that generate_expected_data() samples
+        from exactly. Each candidate of the sampling space is weighted by the
+        number of junctions giving its DelVG sequence and all segments are
+        weighted equally, like with N_SAMPLES samples per segment.
+        :param strain: name of the strain
+        :param df: DelVG dataset
+        :param isize: the size of the sequence before and after the start and
+            end positions. Default is 5.
+
+        :return: Dict with
+            "nucleotides": Pandas DataFrame with probabilites for the
+                nucleotides around the deletion sites, like
+                create_nucleotide_ratio_matrix(), all NaN if no segment can
+                be sampled
+            "direct_repeats": Dict with a numpy array of the direct repeat
+                length probabilities for each segment
+            "n_samples": number of DelVGs the sampled expected data would have
+    '''
+    nuc_matrices = list()
+    direct_repeats = dict()
+    for seg in SEGMENTS:
+        df_s = df.loc[df["Segment"] == seg]
+        if len(df_s) == 0:
+            continue
+        seq = get_sequence(strain, seg)
+        window = get_sampling_window(df_s, len(seq))
+        if window is None:
+            continue
+        s, e = window
+        starts, ends, sizes = get_sampling_classes(seq, s, e)
+        weights = sizes / sizes.sum()
+
+        junctions = get_seq_around_deletion_junction(seq, starts, ends, isize)
+        junction_matrix = create_junction_matrix(pd.DataFrame({"junction": junctions}), "junction")
+        nuc_matrices.append(calc_nucleotide_ratios(junction_matrix, weights))
+        seq_arr = get_sequence_array(strain, seg)
+        direct_repeats[seg], _ = count_direct_repeats(starts, ends, seq_arr, weights=weights)
+
+    if len(nuc_matrices) > 0:
+        nucleotides = sum(nuc_matrices) / len(nuc_matrices)
+    else:
+        # no segment can be sampled, like the empty sampled expected data
+        nucleotides = pd.DataFrame(np.nan, index=range(1, 4*isize+1), columns=list(NUCLEOTIDES.keys()))
+    exp_dict = dict({
+        "nucleotides": nucleotides,
+        "direct_repeats": direct_repeats,
+        "n_samples": N_SAMPLES * len(nuc_matrices)
+    })
+    return exp_dict
+
+def generate_expected_replicates(strain: str, df: pd.DataFrame, n_replicates: int=1000, seed: object=SEED,
+                                 batch_size: int=100, isize: int=5)-> dict:
+    '''
+        Generates many replicates of the expected data at once, to get the
+        null distribution of the nucleotide counts around the deletion sites
+        and of the direct repeat lengths. For each segment as many DelVGs as
+        the dataset has in this segment are drawn without replacement from
+        its sampling space, so the replicates have the size and the segment
+        composition of the observed data. Only the number of DelVGs drawn
+        from each class of create_sampling_space() is sampled (multivariate
+        hypergeometric), the counts of a batch of replicates are then
+        calculated by one matrix multiplication.
+        :param strain: name of the strain
+        :param df: DelVG dataset
+        :param n_replicates: number of expected datasets
+        :param seed: seed used for the random sampling, int or list of ints
+        :param batch_size: number of replicates sampled at once, the random
+            numbers depend on it
+        :param isize: the size of the sequence before and after the start and
+            end positions. Default is 5.
+
+        :return: Dict with
+            "nucleotides": numpy int array (replicates x positions x
+                nucleotides) with the nucleotide counts around the deletion
+                sites, the nucleotides are ordered like NUCLEOTIDES
+            "direct_repeats": numpy int array (replicates x lengths) with the
+                counts of the direct repeat lengths
+            "n_samples": number of DelVGs in each replicate
+            "segments": list of the segments that were sampled
+    '''
+    n_pos = 4 * isize
+    w_len = 5
+    nuc_arr = np.frombuffer("".join(NUCLEOTIDES.keys()).encode("ascii"), dtype=np.uint8)
+    nuc_counts = np.zeros((n_replicates, n_pos, len(nuc_arr)), dtype=np.int64)
+    dr_counts = np.zeros((n_replicates, w_len+1), dtype=np.int64)
+    n_samples = 0
+    segments = list()
+    seed_seqs = np.random.SeedSequence(seed).spawn(len(SEGMENTS))
+    for seg, seed_seq in zip(SEGMENTS, seed_seqs):
+        df_s = df.loc[df["Segment"] == seg]
+        if len(df_s) == 0:
+            continue
+        seq = get_sequence(strain, seg)
+        window = get_sampling_window(df_s, len(seq))
+        if window is None:
+            continue
+        s, e = window
+        starts, ends, sizes = get_sampling_classes(seq, s, e)
+        n = min(len(df_s), sizes.sum())
+
+        # one-hot encoded features of each class, the counts stay below 2**24
+        # so float32 sums are exact
+        junctions = get_seq_around_deletion_junction(seq, starts, ends, isize)
+        junction_matrix = create_junction_matrix(pd.DataFrame({"junction": junctions}), "junction")
+        nuc_features = (junction_matrix[:, :, None] == nuc_arr).reshape(len(starts), -1)
+        lengths, _ = calc_direct_repeat_lengths(starts, ends, get_sequence_array(strain, seg), w_len)
+        dr_features = lengths[:, None] == np.arange(w_len+1)
+        features = np.hstack([nuc_features, dr_features]).astype(np.float32)
+
+        rng = np.random.default_rng(seed_seq)
+        for first in range(0, n_replicates, batch_size):
+            last = min(first + batch_size, n_replicates)
+            class_counts = rng.multivariate_hypergeometric(sizes, n, size=last-first, method="count")
+            batch_counts = np.rint(class_counts.astype(np.float32) @ features).astype(np.int64)
+            nuc_counts[first:last] += batch_counts[:, :nuc_features.shape[1]].reshape(last-first, n_pos, len(nuc_arr))
+            dr_counts[first:last] += batch_counts[:, nuc_features.shape[1]:]
+        n_samples += n
+        segments.append(seg)
+
+    replicates_dict = dict({
+        "nucleotides": nuc_counts,
+        "direct_repeats": dr_counts,
+        "n_samples": n_samples,
+        "segments": segments
+    })
+    return replicates_dict
+
+def calc_empirical_p_values(observed: np.ndarray, replicates: np.ndarray)-> Tuple[np.ndarray, np.ndarray]:
+    '''
+        Compares observed values to a null distribution given by replicates.
+        The two sided p-value is the fraction of replicates that deviate at
+        least as much from the mean of the replicates as the observed value.
+        :param observed: numpy array with the observed values
+        :param replicates: numpy array with the values of the replicates in
+            the first axis and the same shape as observed in the others
+
+        :return: Tuple
+            numpy array with the empirical p-values
+            numpy array with the z-scores, NaN where the replicates do not
+                vary
+    '''
+    mean = replicates.mean(axis=0)
+    std = replicates.std(axis=0)
+    n_extreme = (np.abs(replicates - mean) >= np.abs(observed - mean)).sum(axis=0)
+    p_values = (n_extreme + 1) / (len(replicates) + 1)
+    z_scores = np.divide(observed - mean, std, out=np.full(mean.shape, np.nan), where=std > 0)
+    return p_values, z_scores
+
+def monte_carlo_expected_test(strain: str, df: pd.DataFrame, n_replicates: int=1000, seed: object=SEED)-> Tuple[pd.DataFrame, pd.DataFrame]:
+    '''
+        Tests the nucleotide ratios around the deletion sites and the direct
+        repeat length distribution of a dataset against replicates of the
+        expected data (see generate_expected_replicates()). Segments without
+        a sampling window are left out of the observed data as well.
+        :param strain: name of the strain
+        :param df: DelVG dataset, preprocessed with sequence_df(df)
+        :param n_replicates: number of expected datasets
+        :param seed: seed used for the random sampling, int or list of ints
+
+        :return: Tuple
+            Pandas DataFrame with observed and mean expected ratio, z-score
+                and p-value for each position and nucleotide
+            Pandas DataFrame with observed and mean expected ratio, z-score
+                and p-value for each direct repeat length
+    '''
+    replicates = generate_expected_replicates(strain, df, n_replicates, seed)
+    df = df.loc[df["Segment"].isin(replicates["segments"])]
+    null_nucs = replicates["nucleotides"] / replicates["n_samples"]
+    null_drs = replicates["direct_repeats"] / replicates["n_samples"]
+
+    obs_nucs = calc_nucleotide_ratios(create_junction_matrix(df, "seq_around_deletion_junction"))
+    obs_drs = np.zeros(null_drs.shape[1], dtype=np.int64)
+    for seg in df["Segment"].unique():
+        df_s = df.loc[df["Segment"] == seg]
+        counts, _ = count_direct_repeats(df_s["Start"].to_numpy(), df_s["End"].to_numpy(), get_sequence_array(strain, seg))
+        obs_drs += counts
+    obs_drs = obs_drs / obs_drs.sum()
+
+    p_values, z_scores = calc_empirical_p_values(obs_nucs.to_numpy(), null_nucs)
+    nuc_df = pd.DataFrame(dict({
+        "position": np.repeat(obs_nucs.index, len(obs_nucs.columns)),
+        "nucleotide": np.tile(obs_nucs.columns, len(obs_nucs.index)),
+        "observed": obs_nucs.to_numpy().ravel(),
+        "expected": null_nucs.mean(axis=0).ravel(),
+        "z_score": z_scores.ravel(),
+        "p_value": p_values.ravel()
+    }))
+    p_values, z_scores = calc_empirical_p_values(obs_drs, null_drs)
+    dr_df = pd.DataFrame(dict({
+        "length": np.arange(len(obs_drs)),
+        "observed": obs_drs,
+        "expected": null_drs.mean(axis=0),
+        "z_score": z_scores,
+        "p_value": p_values
+    }))
+    return nuc_df, dr_df
+
+def get_sampling_classes(seq: str, s: Tuple[int, int], e: Tuple[int, int])-> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    '''
+        Gives the unique DelVGs of the sampling space and how often each one
+        is in it.
+        :param seq: RNA sequence
+        :param s: tuple with start and end point of the range for the artifical
+                  start point of the deletion sites
+        :param e: tuple with start and end point of the range for the artifical
+                  end point of the deletion sites
+
+        :return: Tuple
+            numpy array with the start positions
+            numpy array with the end positions
+            numpy array with the number of candidates of each DelVG
+    '''
+    classes = create_sampling_space(seq, s, e).value_counts(["Start", "End"], sort=False)
+    starts = classes.index.get_level_values("Start").to_numpy()
+    ends = classes.index.get_level_values("End").to_numpy()
+    return starts, ends, classes.to_numpy()
+
+def generate_sampling_data(seq: str, s: Tuple[int, int], e: Tuple[int, int],  n: int, random_state: np.random.RandomState=None)-> pd.DataFrame:
     '''
         Generates sampling data by creating random start and end points for
         artificial deletion sites. Generated data is used to calculate the
@@ -1081,11 +2557,60 @@ def generate_sampling_data(seq: str, s: Tuple[int, int], e: Tuple[int, int],  n:
         :param e: tuple with start and end point of the range for the artifical
                   end point of the deletion sites
         :param n: number of samples to generate
+        :param random_state: random state used for sampling, if None the
+            global numpy random state is used
 
         :return: Pandas DataFrame of the artifical data set
     '''
     df_no_duplicates = create_sampling_space(seq, s, e)
-    return df_no_duplicates.sample(n)
+    return df_no_duplicates.sample(n, random_state=random_state)
+
+def generate_sampling_data_adaptive(seq: str, s: Tuple[int, int], e: Tuple[int, int], random_state: np.random.RandomState=None,
+                                    tol: float=ADAPTIVE_TOLERANCE, batch_size: int=ADAPTIVE_BATCH_SIZE, max_n: int=ADAPTIVE_MAX_SAMPLES)-> pd.DataFrame:
+    '''
+        Generates sampling data like generate_sampling_data(), but chooses the
+        number of samples itself. The samples are taken in batches from one
+        permutation of the sampling space and the running frequency of each
+        nucleotide at the start of the deletion sites is monitored. The
+        sampling stops when the standard deviation of these frequencies over
+        the last five batches is below the tolerance, as tested in
+        validate_sampling_approach.py.
+        :param seq: RNA sequence
+        :param s: tuple with start and end point of the range for the artifical
+                  start point of the deletion sites
+        :param e: tuple with start and end point of the range for the artifical
+                  end point of the deletion sites
+        :param random_state: random state used for sampling, if None the
+            global numpy random state is used
+        :param tol: tolerance for the standard deviation of the frequencies
+        :param batch_size: number of samples drawn in each step
+        :param max_n: maximum number of samples
+
+        :return: Pandas DataFrame of the artifical data set, its length is the
+            chosen number of samples
+    '''
+    df_no_duplicates = create_sampling_space(seq, s, e)
+    max_n = min(max_n, len(df_no_duplicates))
+    random_state = np.random if random_state is None else random_state
+    # drawing the first n rows of one permutation is sampling n rows without
+    # replacement for each n
+    order = random_state.permutation(len(df_no_duplicates))[:max_n]
+
+    seq_arr = np.frombuffer(seq.encode("ascii"), dtype=np.uint8)
+    nuc_arr = np.frombuffer("".join(NUCLEOTIDES.keys()).encode("ascii"), dtype=np.uint8)
+    starts = df_no_duplicates["Start"].to_numpy()
+    counts = np.zeros(len(nuc_arr))
+    frequencies = list()
+    n = max_n
+    for batch_end in range(batch_size, max_n+1, batch_size):
+        batch = order[batch_end-batch_size:batch_end]
+        counts += (seq_arr[starts[batch]][:, None] == nuc_arr).sum(axis=0)
+        frequencies.append(counts / batch_end)
+        if len(frequencies) >= 5 and np.std(frequencies[-5:], axis=0).max() < tol:
+            n = batch_end
+            break
+
+    return df_no_duplicates.iloc[order[:n]]
 
 def create_sampling_space(seq: str, s: Tuple[int, int], e: Tuple[int, int])-> pd.DataFrame:
     '''
@@ -1098,46 +2623,160 @@ def create_sampling_space(seq: str, s: Tuple[int, int], e: Tuple[int, int])-> pd
         
         :return: dataframe with possible DelVG candidates
     '''
-    # create all combinations of start and end positions that are possible
-    combinations = [(x, y) for x in range(s[0], s[1]+1) for y in range(e[0], e[1]+1)]
-
-    # create for each the DelVG Sequence
-    sequences = [seq[:start] + seq[end-1:] for (start, end) in combinations]
-
-    # filter out duplicate DelVG sequences while keeping the ones with highest start number
-    start, end = zip(*combinations)
-    temp_df = pd.DataFrame(data=dict({"Start": start, "End": end, "Sequence": sequences}))
-
-    # Find the index of the row with the maximum value in the 'Start' column for each 'Sequence'
-    max_start_index = temp_df.groupby('Sequence')['Start'].idxmax()
-    result_df = temp_df.loc[max_start_index]
-    # Replicate each row by the number of times it was found in the group
-    result_df = result_df.loc[result_df.index.repeat(temp_df.groupby('Sequence').size())]
-    df_no_duplicates = result_df.reset_index(drop=True).drop("Sequence", axis=1)
+    # DelVGs of the same length give the same sequence, when they are shifted
+    # along a direct repeat. (x, y) and (x+1, y+1) are equal if seq[x] is
+    # seq[y-1]. Each position in such a chain is represented by the DelVG
+    # with the highest start, like this no DelVG sequences are created
+    seq_arr = np.frombuffer(seq.encode("ascii"), dtype=np.uint8)
+    starts = np.arange(s[0], s[1]+1)
+    ends = np.arange(e[0], e[1]+1)
+    in_seq = (starts[:, None] < len(seq_arr)) & (ends[None, :] - 1 < len(seq_arr))
+    joined = in_seq & (seq_arr[np.minimum(starts, len(seq_arr)-1)][:, None] == seq_arr[np.minimum(ends, len(seq_arr))-1][None, :])
+
+    rep_start = np.empty((len(starts), len(ends)), dtype=np.int64)
+    rep_start[-1, :] = starts[-1]
+    for i in range(len(starts)-2, -1, -1):
+        rep_start[i, :] = starts[i]
+        rep_start[i, :-1] = np.where(joined[i, :-1], rep_start[i+1, 1:], starts[i])
+
+    rep_end = rep_start + (ends[None, :] - starts[:, None])
+    df_no_duplicates = pd.DataFrame(data=dict({"Start": rep_start.ravel(), "End": rep_end.ravel()}))
 
     return df_no_duplicates
 
 #######################
 ### Data processing ###
 #######################
-def create_nucleotide_ratio_matrix(df: pd.DataFrame, col: str)-> pd.DataFrame:
+def create_junction_matrix(df: pd.DataFrame, col: str)-> np.ndarray:
+    '''
+        Converts the sequences around the deletion sites into a matrix.
+        Shorter sequences are filled up with zeros.
+        :param df: Pandas DataFrame that was created using sequence_df()
+        :param col: column name which sequence to use
+
+        :return: numpy uint8 array with one row per DelVG and the ASCII codes
+            of the nucleotides in the columns
+    '''
+    seqs = np.array(df[col].to_numpy(dtype=str), dtype=bytes)
+    return seqs.view(np.uint8).reshape(len(seqs), seqs.dtype.itemsize)
+
+def calc_nucleotide_ratios(junction_matrix: np.ndarray, weights: np.ndarray=None)-> pd.DataFrame:
+    '''
+        Calculates the ratio of each nucleotide at each position of a matrix
+        created by create_junction_matrix().
+        :param junction_matrix: numpy uint8 array with one row per DelVG
+        :param weights: weight of each DelVG, if None each DelVG is counted
+            once
+
+        :return: Pandas DataFrame with probabilites for the nucleotides
+    '''
+    n_rows, n_pos = junction_matrix.shape
+    codes = junction_matrix.astype(np.int64) + 256 * np.arange(n_pos)
+    if weights is None:
+        counts = np.bincount(codes.ravel(), minlength=256*n_pos)
+    else:
+        counts = np.bincount(codes.ravel(), weights=np.repeat(weights, n_pos), minlength=256*n_pos)
+        n_rows = np.sum(weights)
+    counts = counts.reshape(n_pos, 256)
+    nucs = list(NUCLEOTIDES.keys())
+    probability_matrix = pd.DataFrame(counts[:, [ord(n) for n in nucs]] / n_rows,
+                                      index=range(1, n_pos+1), columns=nucs)
+    return probability_matrix
+
+def create_nucleotide_ratio_matrix(df: pd.DataFrame, col: str, weights: np.ndarray=None)-> pd.DataFrame:
     '''
         Counts nucleotides around the deletion site. Used to create heatmaps.
         :param df: Pandas DataFrame that was created using sequence_df()
         :param col: column name which sequence to use
+        :param weights: weight of each DelVG, if None each DelVG is counted
+            once
 
         :return: Pandas DataFrame with probabilites for the nucleotides
     '''
-    probability_matrix = pd.DataFrame(columns=NUCLEOTIDES.keys())
-    seq_matrix = df.filter([col], axis=1)
-    seq_matrix = seq_matrix[col].str.split("", expand=True)
-    # drop first and last column
-    seq_matrix = seq_matrix.drop([0, len(seq_matrix.columns)-1], axis=1)
-    
-    for n in NUCLEOTIDES.keys():
-        probability_matrix[n] = seq_matrix.apply(lambda x: dict(x.value_counts()).get(n,0)/len(x), axis=0)
+    return calc_nucleotide_ratios(create_junction_matrix(df, col), weights)
 
-    return probability_matrix
+def get_segment_weights(df: pd.DataFrame)-> np.ndarray:
+    '''
+        Gives a weight for each DelVG, so that all segments of a dataset
+        count equally. Is used for the adaptively sampled expected data (see
+        load_expected_data()), where each segment has a different number of
+        DelVGs. If all segments have the same number of DelVGs all weights
+        are 1.
+        :param df: Pandas DataFrame with DelVG data
+
+        :return: numpy array with one weight per DelVG, the weights sum up to
+            the number of DelVGs
+    '''
+    sizes = df["Segment"].map(df["Segment"].value_counts()).to_numpy(dtype=np.float64)
+    return len(df) / (df["Segment"].nunique() * sizes)
+
+def bootstrap_profiles(df: pd.DataFrame, n_boot: int=1000, weighted: bool=False, alpha: float=0.05,
+                       seed: object=SEED, batch_size: int=100)-> Tuple[pd.DataFrame, pd.DataFrame]:
+    '''
+        Calculates bootstrap confidence intervals for the nucleotide ratios
+        around the deletion sites (see create_nucleotide_ratio_matrix()) and
+        the direct repeat length ratios of a dataset. The DelVGs of a batch of
+        replicates are drawn as one index matrix, which is turned into a
+        sparse count matrix and multiplied with the one-hot encoded features
+        of the DelVGs.
+        :param df: Pandas DataFrame that was created using sequence_df()
+        :param n_boot: number of bootstrap replicates
+        :param weighted: if True the DelVGs are drawn with probabilities
+            proportional to their NGS_read_count
+        :param alpha: the intervals cover 1 - alpha of the replicates
+        :param seed: seed used for the random sampling
+        :param batch_size: number of replicates drawn at once
+
+        :return: Tuple
+            Pandas DataFrame with the ratio, lower and upper bound for each
+                position and nucleotide
+            Pandas DataFrame with the ratio, lower and upper bound for each
+                direct repeat length
+    '''
+    w_len = 5
+    n = len(df)
+    nuc_arr = np.frombuffer("".join(NUCLEOTIDES.keys()).encode("ascii"), dtype=np.uint8)
+    junction_matrix = create_junction_matrix(df, "seq_around_deletion_junction")
+    n_pos = junction_matrix.shape[1]
+    nuc_features = (junction_matrix[:, :, None] == nuc_arr).reshape(n, -1)
+    lengths = np.empty(n, dtype=np.int64)
+    for (st, seg), idx in df.groupby(["Strain", "Segment"], sort=False, observed=True).indices.items():
+        lengths[idx], _ = calc_direct_repeat_lengths(df["Start"].to_numpy()[idx], df["End"].to_numpy()[idx], get_sequence_array(st, seg), w_len)
+    dr_features = lengths[:, None] == np.arange(w_len+1)
+    features = np.hstack([nuc_features, dr_features]).astype(np.float64)
+
+    p = None
+    if weighted:
+        p = df["NGS_read_count"].to_numpy(dtype=np.float64)
+        p = p / p.sum()
+    estimate = features.mean(axis=0) if p is None else p @ features
+
+    rng = np.random.default_rng(seed)
+    ratios = np.empty((n_boot, features.shape[1]))
+    for first in range(0, n_boot, batch_size):
+        last = min(first + batch_size, n_boot)
+        idx = rng.choice(n, size=(last-first, n), p=p)
+        rows = np.repeat(np.arange(last-first), n)
+        counts = sparse.csr_matrix((np.ones(idx.size), (rows, idx.ravel())), shape=(last-first, n))
+        ratios[first:last] = counts @ features / n
+    lower, upper = np.quantile(ratios, [alpha/2, 1-alpha/2], axis=0)
+
+    n_nuc = nuc_features.shape[1]
+    nucs = list(NUCLEOTIDES.keys())
+    nuc_df = pd.DataFrame(dict({
+        "position": np.repeat(np.arange(1, n_pos+1), len(nucs)),
+        "nucleotide": np.tile(nucs, n_pos),
+        "ratio": estimate[:n_nuc],
+        "lower": lower[:n_nuc],
+        "upper": upper[:n_nuc]
+    }))
+    dr_df = pd.DataFrame(dict({
+        "length": np.arange(w_len+1),
+        "ratio": estimate[n_nuc:],
+        "lower": lower[n_nuc:],
+        "upper": upper[n_nuc:]
+    }))
+    return nuc_df, dr_df
 
 def plot_heatmap(y: list, x: list, vals: list, ax: object,
                  format=".2f", cmap="coolwarm", vmin=0, vmax=1, cbar=False, cbar_ax=None, cbar_kws=None)-> object:
@@ -1159,8 +2798,9 @@ def plot_heatmap(y: list, x: list, vals: list, ax: object,
 def sequence_df(df: pd.DataFrame, strain: str, isize: int=5)-> pd.DataFrame:
     '''
         Generate a DataFrame with sequence information.
-        :param df: Pandas DataFrame containing the DelVGs in the "key" column
-            Nomenclature: {seg}_{start}_{end}
+        :param df: Pandas DataFrame containing the DelVGs, either in the
+            "Segment", "Start" and "End" columns or in the "key" column
+            (see encode_keys() or nomenclature: {seg}_{start}_{end})
         :param strain: name of the strain
         :param isize: the size of the sequence before and after the start and
             end positions. Default is 5.
@@ -1180,42 +2820,136 @@ def sequence_df(df: pd.DataFrame, strain: str, isize: int=5)-> pd.DataFrame:
 
     '''
     df["Strain"] = strain
-    df["Start"] = df.apply(lambda row: int(row["key"].split("_")[1]), axis=1)
-    df["End"] = df.apply(lambda row: int(row["key"].split("_")[2]), axis=1)
-    df["Segment"] = df.apply(lambda row: row["key"].split("_")[0], axis=1)
+    # take the coordinates from the columns if given, only unpack "key" for
+    # inputs that carry nothing else
+    if not {"Segment", "Start", "End"}.issubset(df.columns):
+        if pd.api.types.is_integer_dtype(df["key"]):
+            segments, starts, ends = decode_keys(df["key"])
+        else:
+            key_parts = df["key"].str.split("_", expand=True)
+            segments, starts, ends = key_parts[0], key_parts[1], key_parts[2]
+        df["Start"] = starts
+        df["End"] = ends
+        df["Segment"] = segments
+    df["Start"] = df["Start"].astype("int64")
+    df["End"] = df["End"].astype("int64")
+    df["Segment"] = df["Segment"].astype(str)
     df["isize"] = isize
-    def wrap_get_sequence(row):
-        return get_sequence(row["Strain"], row["Segment"])
-    df["full_seq"] = df.apply(wrap_get_sequence, axis=1)
-    def wrap_get_deleted_sequence(row):
-        return get_deleted_sequence(row["key"], row["Strain"])
-    df["deleted_sequence"] = df.apply(wrap_get_deleted_sequence, axis=1)
-    def get_seq_around_del(row):
-        seq_head = get_dip_sequence(row["key"], row["Strain"])[1]
-        seq_foot = get_dip_sequence(row["key"], row["Strain"])[2]
-        
-        seq_before_start = seq_head[-row["isize"]:]
-        seq_after_start = row["deleted_sequence"][:row["isize"]]
-        seq_before_end = row["deleted_sequence"][-row["isize"]:]
-        seq_after_end = seq_foot[:row["isize"]]
-        return seq_before_start + seq_after_start + seq_before_end + seq_after_end
-    df["seq_around_deletion_junction"] = df.apply(get_seq_around_del, axis=1)
+
+    return add_sequence_columns(df, isize)
+
+def add_sequence_columns(df: pd.DataFrame, isize: int=5, columns: list=SEQUENCE_COLUMNS)-> pd.DataFrame:
+    '''
+        Derives sequence columns from the shared reference sequences. Allows
+        to add them on demand to DataFrames created by compact_delvg_df().
+        :param df: Pandas DataFrame with "Strain", "Segment", "Start" and "End"
+            column
+        :param isize: the size of the sequence before and after the start and
+            end positions. Default is 5.
+        :param columns: sequence columns to add, subset of SEQUENCE_COLUMNS
+
+        :return: Pandas DataFrame with the added columns
+    '''
+    values = dict({col: np.empty(len(df), dtype=object) for col in columns})
+    starts = df["Start"].to_numpy(dtype=np.int64)
+    ends = df["End"].to_numpy(dtype=np.int64)
+    # fetch each reference only once and process all its DelVGs together
+    for (st, seg), idx in df.groupby(["Strain", "Segment"], sort=False, observed=True).indices.items():
+        seq = get_sequence(st, seg)
+        s_idx = starts[idx]
+        e_idx = ends[idx]
+        if "full_seq" in values:
+            values["full_seq"][idx] = seq
+        if "deleted_sequence" in values:
+            values["deleted_sequence"][idx] = [seq[s:e-1] for s, e in zip(s_idx, e_idx)]
+        if "seq_around_deletion_junction" in values:
+            values["seq_around_deletion_junction"][idx] = get_seq_around_deletion_junction(seq, s_idx, e_idx, isize)
+
+    for col in columns:
+        df[col] = values[col]
     return df
 
-def preprocess(strain: str, df: pd.DataFrame, thresh: int)-> pd.DataFrame:
+def get_seq_around_deletion_junction(seq: str, starts: np.ndarray, ends: np.ndarray, isize: int=5)-> np.ndarray:
+    '''
+        Get the sequences around the deletion junctions of multiple DelVGs of
+        the same segment at once.
+        :param seq: RNA sequence of the segment
+        :param starts: start positions of the deletion sites
+        :param ends: end positions of the deletion sites
+        :param isize: the size of the sequence before and after the start and
+            end positions
+
+        :return: numpy array with one string of length 4*isize per DelVG
+    '''
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    result = np.empty(len(starts), dtype=object)
+    # rows where all four windows lie completely inside the sequence and the
+    # deletion is not shorter than isize can be cut out by array indexing
+    regular = (starts >= isize) & (ends - 1 - starts >= isize) & (ends - 1 + isize <= len(seq))
+    if regular.any():
+        seq_arr = np.frombuffer(seq.encode("ascii"), dtype=np.uint8)
+        offsets = np.arange(2 * isize)
+        idx = np.concatenate([starts[regular, None] - isize + offsets,
+                              ends[regular, None] - 1 - isize + offsets], axis=1)
+        width = 4 * isize
+        joined = seq_arr[idx].tobytes().decode("ascii")
+        result[regular] = [joined[i:i+width] for i in range(0, len(joined), width)]
+
+    # at the borders of the sequence fall back to slicing to keep the
+    # behaviour of python strings
+    for i in np.flatnonzero(~regular):
+        seq_head = seq[:starts[i]]
+        seq_foot = seq[ends[i]-1:]
+        deleted_seq = seq[starts[i]:ends[i]-1]
+        result[i] = seq_head[-isize:] + deleted_seq[:isize] + deleted_seq[-isize:] + seq_foot[:isize]
+    return result
+
+def preprocess(strain: str, df: pd.DataFrame, thresh: int, compact: bool=False)-> pd.DataFrame:
     '''
         Excluding DelVGs with to low NGS count and running sequence_df().
+        The column "key" holds the packed int64 key of encode_keys(), not the
+        string {seg}_{start}_{end}. Use keys_to_str() or str_to_keys() to
+        compare it with string keys.
         :param strain: name of the strain
         :param df: Pandas DataFrame with DelVG data
         :param thresh: Threshold for min number of count for each DelVG
+        :param compact: if True no sequence columns are created and the
+            result is passed to compact_delvg_df()
 
         :return: resulting df of sequence_df() function
     '''
     if thresh > 1:
         df = df[df["NGS_read_count"] >= thresh].copy()
-    df["key"] = df["Segment"] + "_" + df["Start"].map(str) + "_" + df["End"].map(str)
+    if compact:
+        df["Strain"] = strain
+        df["isize"] = 5
+        return compact_delvg_df(df)
+    df["key"] = encode_keys(df["Segment"], df["Start"], df["End"])
     return sequence_df(df, strain)
 
+def compact_delvg_df(df: pd.DataFrame)-> pd.DataFrame:
+    '''
+        Creates a memory saving representation of a DelVG dataset. The
+        sequence columns and the key are dropped, they can be derived again
+        by add_sequence_columns(). Text columns are stored as categoricals,
+        positions as int32 and the NGS count as uint32.
+        :param df: Pandas DataFrame with DelVG data
+
+        :return: compact Pandas DataFrame
+    '''
+    compact_df = df.drop(columns=[c for c in SEQUENCE_COLUMNS + ["key"] if c in df.columns])
+    for col in compact_df.columns:
+        if col in ["Start", "End"]:
+            compact_df[col] = compact_df[col].astype("int32")
+        elif col == "NGS_read_count":
+            compact_df[col] = compact_df[col].astype("uint32")
+        elif col == "isize":
+            compact_df[col] = compact_df[col].astype("int8")
+        elif not pd.api.types.is_numeric_dtype(compact_df[col]):
+            compact_df[col] = compact_df[col].astype("category")
+    return compact_df
+
 def get_deleted_sequence(delvg_id: str, strain: str)-> str:
     '''
         Return the sequence of the deletion site.
@@ -10,10 +10,11 @@ import pandas as pd
 import matplotlib.pyplot as plt
 
 from typing import Tuple
+from concurrent.futures import ProcessPoolExecutor
 
 sys.path.insert(0, "..")
-from utils import load_single_dataset, load_dataset, join_data
-from utils import RESULTSPATH, DATAPATH, SEGMENT_DICTS
+from utils import load_single_dataset, load_dataset, join_data, encode_keys, read_table_cached
+from utils import RESULTSPATH, DATAPATH, SEGMENT_DICTS, N_WORKERS
 
 
 def load_pelz2021_rsc()-> dict:
@@ -24,12 +25,12 @@ def load_pelz2021_rsc()-> dict:
     '''
     filename = "pelz_2021.xlsx"
     file_path = os.path.join(DATAPATH, "RSC_estimation", filename)
-    data_dict = pd.read_excel(io=file_path,
-                              sheet_name=None,
-                              header=0,
-                              na_values=["", "None"],
-                              keep_default_na=False)
-    return join_data(data_dict["PR8"])
+    data = read_table_cached(file_path,
+                             sheet_name="PR8",
+                             header=0,
+                             na_values=["", "None"],
+                             keep_default_na=False)
+    return join_data(data)
 
 
 def load_alnaji2021_rsc()-> dict:
@@ -39,7 +40,7 @@ def load_alnaji2021_rsc()-> dict:
         :return: dictionary with strain name as key and data frame as value
     '''
     path = os.path.join(DATAPATH, "RSC_estimation", "Alnaji2021.xlsx")
-    data = pd.read_excel(path, na_values=["", "None"], keep_default_na=False)
+    data = read_table_cached(path, na_values=["", "None"], keep_default_na=False)
     return join_data(data)
 
 
@@ -50,12 +51,11 @@ def load_alnaji2019_rsc(strain)-> dict:
         :return: dictionary with strain name as key and data frame as value
     '''
     file_path = os.path.join(DATAPATH, "RSC_estimation", f"Alnaji2019_{strain}.xlsx")
-    data_dict = pd.read_excel(io=file_path,
-                              sheet_name=None,
-                              header=0,
-                              na_values=["", "None"],
-                              keep_default_na=False)
-    df = data_dict[strain]
+    df = read_table_cached(file_path,
+                           sheet_name=strain,
+                           header=0,
+                           na_values=["", "None"],
+                           keep_default_na=False)
     return join_data(df)
 
 
@@ -67,15 +67,26 @@ def load_mendes2021_rsc()-> dict:
         :return: dictionary with strain name as key and data frame as value
     '''
     file_path = os.path.join(DATAPATH, "RSC_estimation", "Mendes2021.tsv")
-    data = pd.read_csv(file_path,
-                            header=0,
-                            na_values=["", "None"],
-                            keep_default_na=False,
-                            sep="\t")
+    data = read_table_cached(file_path,
+                             header=0,
+                             na_values=["", "None"],
+                             keep_default_na=False,
+                             sep="\t")
     
     return join_data(data)
 
 
+# experiment name: (dataset, loader of the publication data, loader arguments)
+RSC_COMPARISONS = dict({
+    "pelz": ("Pelz2021", load_pelz2021_rsc, ()),
+    "alnaji2021": ("Alnaji2021", load_alnaji2021_rsc, ()),
+    "alnaji2019_Cal07": ("Alnaji2019_Cal07", load_alnaji2019_rsc, ("Cal07",)),
+    "alnaji2019_NC": ("Alnaji2019_NC", load_alnaji2019_rsc, ("NC",)),
+    "alnaji2019_Perth": ("Alnaji2019_Perth", load_alnaji2019_rsc, ("Perth",)),
+    "alnaji2019_BLEE": ("Alnaji2019_BLEE", load_alnaji2019_rsc, ("BLEE",))
+})
+
+
 def compare_datasets(d1: pd.DataFrame, d2: pd.DataFrame, thresh: int=1)-> Tuple[float, int, int]:
     '''
         Calculate the intersection of two given datasets.
@@ -90,37 +101,83 @@ def compare_datasets(d1: pd.DataFrame, d2: pd.DataFrame, thresh: int=1)-> Tuple[
     '''
     d1 = d1[d1["NGS_read_count"] >= thresh]
     d2 = d2[d2["NGS_read_count"] >= thresh]
-    DI_sets = [set(d["Segment"] + "_" + d["Start"].astype(str) + "_" + d["End"].astype(str)) for d in [d1, d2]]
-    n_intersect = len(DI_sets[0] & DI_sets[1])
+    segments = sorted(set(d1["Segment"]) | set(d2["Segment"]))
+    DI_sets = [np.unique(encode_keys(d["Segment"], d["Start"], d["End"], segments)) for d in [d1, d2]]
+    n_intersect = np.intersect1d(DI_sets[0], DI_sets[1], assume_unique=True).size
     return n_intersect, len(DI_sets[0]), len(DI_sets[1])
 
 
-def loop_threshs(d1: pd.DataFrame, d2: pd.DataFrame, name: str)-> int:
+def max_count_per_junction(d: pd.DataFrame, segments: list)-> Tuple[np.ndarray, np.ndarray]:
+    '''
+        Calculates the highest NGS count of each unique DelVG. A DelVG passes
+        a threshold if any of its entries does.
+        :param d: dataset
+        :param segments: list of segment names used for encoding the keys
+
+        :return: Tuple
+            sorted unique keys of the DelVGs, see encode_keys()
+            highest NGS count for each key
+    '''
+    d = d[d["NGS_read_count"].notna()]
+    keys = encode_keys(d["Segment"], d["Start"], d["End"], segments)
+    counts = d["NGS_read_count"].to_numpy(dtype=float)
+    order = np.lexsort((counts, keys))
+    keys = keys[order]
+    last = np.append(keys[1:] != keys[:-1], True)
+    return keys[last], counts[order][last]
+
+
+def compare_datasets_sweep(d1: pd.DataFrame, d2: pd.DataFrame, threshs: object)-> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    '''
+        Calculate the intersection of two given datasets for many thresholds
+        at once. Gives the same results as calling compare_datasets() for each
+        threshold, but the datasets are only joined once. The number of DelVGs
+        above each threshold is read from the sorted counts.
+        :param d1: dataset 1
+        :param d2: dataset 2
+        :param threshs: Thresholds for min number of count for each DelVG
+        
+        :return: Tuple
+            number of intersecting DelVGs for each threshold
+            number of DelVGs in dataset 1 for each threshold
+            number of DelVGs in dataset 2 for each threshold
+    '''
+    threshs = np.asarray(threshs)
+    segments = sorted(set(d1["Segment"]) | set(d2["Segment"]))
+    keys_1, counts_1 = max_count_per_junction(d1, segments)
+    keys_2, counts_2 = max_count_per_junction(d2, segments)
+    _, idx_1, idx_2 = np.intersect1d(keys_1, keys_2, assume_unique=True, return_indices=True)
+    counts_inter = np.minimum(counts_1[idx_1], counts_2[idx_2])
+
+    def n_above(counts):
+        counts = np.sort(counts)
+        return counts.size - np.searchsorted(counts, threshs, side="left")
+
+    return n_above(counts_inter), n_above(counts_1), n_above(counts_2)
+
+
+def loop_threshs(d1: pd.DataFrame, d2: pd.DataFrame, name: str, threshs: object=np.arange(51), results_path: str=None)-> int:
     '''
         Loops over different thresholds for the RSC and calcualtes the
         intersection of two given datasets.
         :param d1: dataset 1
         :param d2: dataset 2
         :param name: name of the experiment
+        :param threshs: thresholds to test, sorted ascending
+        :param results_path: folder the results are saved in, RESULTSPATH if
+            None
     '''
-    threshs = np.arange(51)
-    fracs = list()
-    ns_new = list()
-    ns_orig = list()
-    above_thresh = False
+    threshs = np.asarray(threshs)
+    n_inter, ns_new, ns_orig = compare_datasets_sweep(d1, d2, threshs)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fracs = 2 * n_inter / (ns_new + ns_orig)
+    above = np.flatnonzero(fracs > 0.75)
+    above_thresh = above.size > 0
     rsc = np.nan
     text_y = 100
-    for t in threshs:
-        n_inter, n_new, n_orig = compare_datasets(d1, d2, t)
-        frac = 2 * n_inter / (n_new + n_orig)
-        fracs.append(frac)
-        ns_new.append(n_new)
-        ns_orig.append(n_orig)
-
-        if frac > 0.75 and not above_thresh:
-            rsc = t
-            above_thresh = True
-            text_y = n_new
+    if above_thresh:
+        rsc = threshs[above[0]]
+        text_y = ns_new[above[0]]
 
     # plot fraction of intersecting DelVGs between the two datasets
     plt.figure(figsize=(5, 4), tight_layout=True) 
@@ -131,8 +188,8 @@ def loop_threshs(d1: pd.DataFrame, d2: pd.DataFrame, name: str)-> int:
     plt.ylabel("Ratio of common DelVGs")
     plt.xlabel("Cutoff value")
     plt.ylim(top=1, bottom=0)
-    plt.xlim(left=0, right=50)
-    save_path = os.path.join(RESULTSPATH, "validation_estimation")
+    plt.xlim(left=0, right=threshs[-1])
+    save_path = os.path.join(RESULTSPATH if results_path is None else results_path, "validation_estimation")
     if not os.path.exists(save_path):
         os.makedirs(save_path)
     plt.savefig(os.path.join(save_path, f"{name}_common_DelVGs.png"))
@@ -149,67 +206,68 @@ def loop_threshs(d1: pd.DataFrame, d2: pd.DataFrame, name: str)-> int:
     plt.ylabel("Number of unique DelVGs")
     plt.xlabel("Cutoff value")
     plt.ylim(bottom=0)
-    plt.xlim(left=0, right=50)
+    plt.xlim(left=0, right=threshs[-1])
     plt.savefig(os.path.join(save_path, f"{name}_unique_DelVGs.png"))
     plt.close()
 
     return rsc
  
 
+def run_rsc_comparison(name: str, results_path: str=None)-> Tuple[str, int, int, int]:
+    '''
+        Estimates the RSC for one publication by comparing the generated data
+        to the data of the publication, see RSC_COMPARISONS.
+        :param name: name of the experiment, key of RSC_COMPARISONS
+        :param results_path: folder the results are saved in, RESULTSPATH if
+            None
+
+        :return: Tuple
+            name of the experiment
+            number of DelVGs in the generated dataset
+            number of DelVGs in the dataset of the publication
+            estimated RSC
+    '''
+    dataset, load_orig, args = RSC_COMPARISONS[name]
+    df = load_dataset(dataset)
+    orig = load_orig(*args)
+    return name, df.shape[0], orig.shape[0], loop_threshs(df, orig, name, results_path=results_path)
+
+
+def run_all_rsc_comparisons(names: list=None, workers: int=N_WORKERS, results_path: str=None)-> pd.DataFrame:
+    '''
+        Estimates the RSC for all publications in parallel and writes one
+        summary table.
+        :param names: names of the experiments, all of RSC_COMPARISONS if None
+        :param workers: number of processes used
+        :param results_path: folder the results are saved in, RESULTSPATH if
+            None. Is passed to the processes explicitly, as they do not see
+            changes of the global variable when they are not forked
+
+        :return: Pandas DataFrame with one row per experiment
+    '''
+    names = list(RSC_COMPARISONS.keys()) if names is None else names
+    results_path = RESULTSPATH if results_path is None else results_path
+    n_processes = min(workers, len(names))
+    if n_processes > 1:
+        with ProcessPoolExecutor(max_workers=n_processes) as executor:
+            results = list(executor.map(run_rsc_comparison, names, [results_path] * len(names)))
+    else:
+        results = [run_rsc_comparison(name, results_path) for name in names]
+
+    summary_df = pd.DataFrame(results, columns=["name", "n_generated", "n_original", "RSC"])
+    save_path = os.path.join(results_path, "validation_estimation")
+    if not os.path.exists(save_path):
+        os.makedirs(save_path)
+    summary_df.to_csv(os.path.join(save_path, "RSC_summary.csv"), index=False)
+    return summary_df
+
+
 if __name__ == "__main__":
     plt.style.use("seaborn")
     RESULTSPATH = os.path.dirname(RESULTSPATH)
-    rscs = list()
-    ns = list()
-    
-    ### Pelz ###
-    name = "pelz"
-    print(f"### {name} ###")
-    pelz = load_dataset("Pelz2021")
-    ns.append(pelz.shape[0])
-    orig_pelz = load_pelz2021_rsc()
-    rscs.append(loop_threshs(pelz, orig_pelz, name))
-
-    ### Alnaji2021 ###
-    name = "alnaji2021"
-    print(f"### {name} ###")
-    alnaji2021 = load_dataset("Alnaji2021")
-    ns.append(alnaji2021.shape[0])
-    orig_alnaji2021 = load_alnaji2021_rsc()
-    rscs.append(loop_threshs(alnaji2021, orig_alnaji2021, name))
-
-    ### Alnaji2019 Cal07 ###
-    strain = "Cal07"
-    print(f"### {strain} ###")
-    df = load_dataset("Alnaji2019_Cal07")
-    ns.append(df.shape[0])
-    orig = load_alnaji2019_rsc(strain)
-    rscs.append(loop_threshs(df, orig, f"alnaji2019_{strain}"))
-
-    ### Alnaji2019 NC ###
-    strain = "NC"
-    print(f"### {strain} ###")
-    df = load_dataset("Alnaji2019_NC")
-    ns.append(df.shape[0])
-    orig = load_alnaji2019_rsc(strain)
-    rscs.append(loop_threshs(df, orig, f"alnaji2019_{strain}"))
-
-    ### Alnaji2019 Perth ###
-    strain = "Perth"
-    print(f"### {strain} ###")
-    df = load_dataset("Alnaji2019_Perth")
-    ns.append(df.shape[0])
-    orig = load_alnaji2019_rsc(strain)
-    rscs.append(loop_threshs(df, orig, f"alnaji2019_{strain}"))
-
-    ### Alnaji2019 BLEE ###
-    strain = "BLEE"
-    print(f"### {strain} ###")
-    df = load_dataset("Alnaji2019_BLEE")
-    ns.append(df.shape[0])
-    orig = load_alnaji2019_rsc(strain)
-    rscs.append(loop_threshs(df, orig, f"alnaji2019_{strain}"))
+    summary_df = run_all_rsc_comparisons(results_path=RESULTSPATH)
+    print(summary_df)
 
     # this shows that no dependences between dataset size and RCS is given
-    print(rscs)
-    print(np.mean(rscs))
\ No newline at end of file
+    print(summary_df["RSC"].to_list())
+    print(summary_df["RSC"].mean())
@@ -13,7 +13,7 @@ import pandas as pd
 import matplotlib.pyplot as plt
 
 sys.path.insert(0, "..")
-from utils import load_single_dataset, preprocess
+from utils import load_single_dataset, preprocess, to_long_format
 from utils import SEGMENTS, CUTOFF, DATAPATH
 from overall_comparision.general_analyses import diff_start_end_lengths
 
@@ -63,4 +63,4 @@ if __name__ == "__main__":
     dfs.append(preprocess(strain, orig_mendes, CUTOFF))
     dfnames.append("orig. v21depl")
 
-    diff_start_end_lengths(dfs, dfnames, folder="validation_estimation")
+    diff_start_end_lengths(to_long_format(dfs, dfnames), folder="validation_estimation")
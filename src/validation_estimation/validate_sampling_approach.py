@@ -11,7 +11,7 @@ import matplotlib.pyplot as plt
 
 sys.path.insert(0, "..")
 from utils import RESULTSPATH, SEGMENTS, DATASET_STRAIN_DICT, CMAP
-from utils import get_sequence, load_all, create_sampling_space, get_dataset_names
+from utils import get_sequence, load_all, create_sampling_space, get_dataset_names, generate_expected_data
 
 
 def plot_distribution(pos_dict: dict, name: str)-> None:
@@ -130,6 +130,23 @@ def test_sampling_approach(dfs: list, dfnames: list)-> None:
     print(max_thresh)
 
 
+def report_adaptive_sample_sizes(dfs: list, dfnames: list)-> None:
+    '''
+        Generates the expected data with the adaptive sampling and reports
+        the number of samples that was chosen for each segment.
+        :param dfs: The list of DataFrames containing the data
+        :param dfnames: The names associated with each DataFrame in `dfs`
+
+        :return: None
+    '''
+    for df, dfname in zip(dfs, dfnames):
+        samp_df = generate_expected_data(DATASET_STRAIN_DICT[dfname], df, adaptive=True)
+        n_samples = samp_df["Segment"].value_counts(sort=False)
+        print(dfname)
+        for seg, n in n_samples.items():
+            print(f"\t{seg}\t{n}")
+
+
 if __name__ == "__main__":
     plt.style.use("seaborn")
     RESULTSPATH = os.path.dirname(RESULTSPATH)
@@ -139,4 +156,5 @@ if __name__ == "__main__":
     dfs, _ = load_all(dfnames)
 
     test_sampling_approach(dfs, dfnames)
+    report_adaptive_sample_sizes(dfs, dfnames)
 